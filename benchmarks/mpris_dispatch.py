@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# Measure MPRIS method and property dispatch against a private session bus.
+#
+# Usage: python3 benchmarks/mpris_dispatch.py [calls]
+
+import importlib.util
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from gi.repository import Gio, GLib
+
+
+ROOT = Path(__file__).resolve().parent.parent
+XML_URI = (ROOT / "data" / "mpris2.xml").as_uri()
+
+APP_ID = "ru.slie.beat.bench"
+BUS_NAME = f"org.mpris.MediaPlayer2.{APP_ID}"
+OBJECT_PATH = "/org/mpris/MediaPlayer2"
+PROPERTIES_IFACE = "org.freedesktop.DBus.Properties"
+PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+PLAYLISTS_IFACE = "org.mpris.MediaPlayer2.Playlists"
+
+
+def load_dbus_module():
+    spec = importlib.util.spec_from_file_location(
+        "beat_dbus", ROOT / "src" / "components" / "mpris2" / "dbus.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def serve():
+    module = load_dbus_module()
+
+    class BenchPlayer(module.DBusInterface):
+        def __init__(self):
+            super().__init__(APP_ID, XML_URI)
+            self.register_properties(PLAYER_IFACE, {
+                "PlaybackStatus": lambda: GLib.Variant("s", "Playing"),
+                "Position": lambda: GLib.Variant("x", 0),
+                "CanGoNext": lambda: GLib.Variant("b", True),
+            })
+
+        def play(self):
+            pass
+
+        def get_playlists(self, index, max_count, order, reverse_order):
+            return [(f"/ru/slie/beat/Playlist/{i}", f"playlist {i}", "")
+                    for i in range(index, index + min(max_count, 10))]
+
+    player = BenchPlayer()
+    GLib.MainLoop().run()
+
+
+def wait_for_name(con):
+    for _ in range(100):
+        reply = con.call_sync("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                              "NameHasOwner", GLib.Variant("(s)", (BUS_NAME,)), None,
+                              Gio.DBusCallFlags.NONE, -1, None)
+        if reply.unpack()[0]:
+            return
+        time.sleep(0.05)
+    raise RuntimeError(f"{BUS_NAME} did not appear on the bus")
+
+
+def bench(con, label, interface_name, method, parameters, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        con.call_sync(BUS_NAME, OBJECT_PATH, interface_name, method, parameters, None,
+                      Gio.DBusCallFlags.NONE, -1, None)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {calls / elapsed:10.0f} calls/s")
+
+
+def main():
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+        return
+
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    daemon = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+                              stdout=subprocess.PIPE, text=True)
+    address = daemon.stdout.readline().strip()
+    env = dict(os.environ, DBUS_SESSION_BUS_ADDRESS=address)
+    server = subprocess.Popen([sys.executable, __file__, "--serve"], env=env)
+    try:
+        con = Gio.DBusConnection.new_for_address_sync(
+            address,
+            Gio.DBusConnectionFlags.AUTHENTICATION_CLIENT | Gio.DBusConnectionFlags.MESSAGE_BUS_CONNECTION,
+            None, None)
+        wait_for_name(con)
+
+        bench(con, "Player.Play", PLAYER_IFACE, "Play", None, calls)
+        bench(con, "Properties.Get PlaybackStatus", PROPERTIES_IFACE, "Get",
+              GLib.Variant("(ss)", (PLAYER_IFACE, "PlaybackStatus")), calls)
+        bench(con, "Properties.GetAll Player", PROPERTIES_IFACE, "GetAll",
+              GLib.Variant("(s)", (PLAYER_IFACE,)), calls)
+        bench(con, "Playlists.GetPlaylists", PLAYLISTS_IFACE, "GetPlaylists",
+              GLib.Variant("(uusb)", (0, 10, "UserDefined", False)), calls)
+    finally:
+        server.terminate()
+        daemon.terminate()
+        server.wait()
+        daemon.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# Measure how long it takes to fill a playlist model.
+#
+# Usage: python3 benchmarks/playlist_load.py [rows ...]
+
+import importlib.util
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import gi
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gio, Gtk
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_beat():
+    data_dir = ROOT / "data"
+    with tempfile.TemporaryDirectory() as tmp:
+        target = Path(tmp, "beat.gresource")
+        subprocess.run(["glib-compile-resources", "--sourcedir", str(data_dir),
+                        "--target", str(target), str(data_dir / "beat.gresource.xml")], check=True)
+        Gio.resources_register(Gio.Resource.load(str(target)))
+
+    spec = importlib.util.spec_from_file_location("beat", ROOT / "src" / "__init__.py",
+                                                  submodule_search_locations=[str(ROOT / "src")])
+    sys.modules["beat"] = importlib.util.module_from_spec(spec)
+
+
+def make_rows(count):
+    return [{"src": f"/music/artist {i % 500}/album {i % 50}/{i:06d}.flac",
+             "artist": f"artist {i % 500}",
+             "album": f"album {i % 50}",
+             "title": f"title {i}",
+             "length": f"{i % 10}:{i % 60:02d}"} for i in range(count)]
+
+
+def bench_add_row(store_cls, rows):
+    store = store_cls("bench")
+    view = Gtk.TreeView(model=store)
+    start = time.perf_counter()
+    for row in rows:
+        store.add_row(row)
+    return time.perf_counter() - start, view
+
+
+def bench_add_rows(store_cls, rows):
+    store = store_cls("bench")
+    view = Gtk.TreeView(model=store)
+    start = time.perf_counter()
+    view.set_model(None)
+    store.add_rows(rows)
+    view.set_model(store)
+    return time.perf_counter() - start, view
+
+
+def main():
+    load_beat()
+    from beat.components.store import PlayListStore
+    from beat.components.virtual_store import VirtualPlayListStore
+
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000]
+    print(f"{'rows':>8} {'add_row':>10} {'add_rows':>10} {'virtual':>10}")
+    for size in sizes:
+        rows = make_rows(size)
+        legacy, _ = bench_add_row(PlayListStore, rows)
+        bulk, _ = bench_add_rows(PlayListStore, rows)
+        virtual, _ = bench_add_rows(VirtualPlayListStore, rows)
+        print(f"{size:>8} {legacy:>9.3f}s {bulk:>9.3f}s {virtual:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+# Measure building and querying the playlist search index.
+#
+# Usage: python3 benchmarks/search_index.py [rows]
+
+import importlib.util
+import random
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "to", "su", "vel", "dor", "an", "qu", "ix", "be", "li",
+             "or", "sha", "tem", "gu", "pi", "wy"]
+
+QUERIES = ["ra", "kalo", "dorvel", "quix be", "vel dor ka", "zz", "shatem gu"]
+
+
+def load_search():
+    spec = importlib.util.spec_from_file_location("search", ROOT / "src" / "components" / "search.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def word(rnd):
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def make_rows(count):
+    rnd = random.Random(1)
+    artists = [f"{word(rnd)} {word(rnd)}" for _ in range(max(1, count // 30))]
+    albums = [f"{word(rnd)} {word(rnd)}" for _ in range(max(1, count // 10))]
+    return [(artists[i % len(artists)], albums[i % len(albums)],
+             f"{word(rnd)} {word(rnd)} {word(rnd)}") for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    search = load_search()
+    rows = make_rows(count)
+
+    index = search.SearchIndex()
+    start = time.perf_counter()
+    for row_id, row in enumerate(rows, 1):
+        index.add(row_id, row)
+    index.build_bitmaps()
+    print(f"build {count} rows: {time.perf_counter() - start:.2f} s")
+
+    for query in QUERIES:
+        start = time.perf_counter()
+        result = index.query(query)
+        elapsed = time.perf_counter() - start
+        print(f"{query!r:<14} {len(result):>7} rows {elapsed * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
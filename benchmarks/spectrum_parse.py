@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# Compare the cost of reading spectrum magnitudes from a message structure.
+#
+# Usage: python3 benchmarks/spectrum_parse.py [bands] [messages]
+
+import sys
+import time
+from array import array
+
+import gi
+gi.require_version("Gst", "1.0")
+from gi.repository import Gst
+
+
+def make_structure(bands):
+    values = ", ".join(f"(float){-80.0 + i * 0.5}" for i in range(bands))
+    return Gst.Structure.new_from_string(f"spectrum, magnitude=(float){{ {values} }}")
+
+
+def parse_string(structure):
+    fullstr = structure.to_string()
+    magstr = fullstr[fullstr.find('{') + 1: fullstr.rfind('}') - 1]
+    magnitude_list = [float(x) for x in magstr.split(',')]
+    return [i * 1.0 for i in magnitude_list]
+
+
+def parse_value_list(structure, buffer):
+    success, values = structure.get_list("magnitude")
+    get_nth = values.get_nth
+    for i in range(values.n_values):
+        buffer[i] = get_nth(i)
+    return buffer
+
+
+def measure(func, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main():
+    Gst.init(None)
+    bands = int(sys.argv[1]) if len(sys.argv) > 1 else 96
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    structure = make_structure(bands)
+    buffer = array('f', bytes(4 * bands))
+
+    before = measure(lambda: parse_string(structure), count)
+    after = measure(lambda: parse_value_list(structure, buffer), count)
+
+    print(f"bands: {bands}, messages: {count}")
+    print(f"to_string + float(): {before:8.1f} us/message")
+    print(f"value list + buffer: {after:8.1f} us/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,9 @@ from gettext import gettext as _
 from beat.window import BeatWindow
 from beat.settings import Settings
 from beat.components.queue_manager import QueueManager
+from beat.components.art import ArtService
+from beat.components.position import PositionService
+from beat.components.library import Library
 from beat.components.indicator import StatusIndicator
 from beat.components.mpris2 import MPRIS2
 from beat.components.media_keys import MediaKeys
@@ -39,6 +42,9 @@ class Application(Gtk.Application):
 
         self.__window = None
         self.__queue = QueueManager(self)
+        self.__art = ArtService()
+        self.__position = PositionService(self.__queue.props.player)
+        self.__library = Library()
 
         self.connect("command-line", self.__on_command_line)
         # command line
@@ -52,12 +58,20 @@ class Application(Gtk.Application):
                     _("available actions: play, pause, stop, next, prev"),
                     None)
 
+        self.add_main_option("library-add", ord("l"), GLib.OptionFlags.NONE,
+                    GLib.OptionArg.STRING_ARRAY,
+                    _("Add a folder to the music library"),
+                    None)
+
 
     def __on_command_line(self, _app, command_line):
         options = command_line.get_options_dict().end().unpack()
         if not self.__window:
             self.activate()
 
+        for path in options.get("library-add", []):
+            self.__library.add_root(command_line.create_file_for_arg(path).get_path())
+
         if "action" in options:
             action = options['action']
             if action == "play":
@@ -85,13 +99,7 @@ class Application(Gtk.Application):
         if not playlist or (not is_append and playlist.is_saved()):
             playlist = self.__window.create_playlist_tab(_("new playlist"), selected=True)
 
-        added_track_refs = []
-
-        for f in files:
-            added_track_refs.extend(playlist.add_tracks(f))
-
-        if not options.contains("append") and added_track_refs:
-            self.__queue.play_ref(added_track_refs[0])
+        playlist.add_tracks(files, play=not is_append)
 
         return 0
 
@@ -100,6 +108,19 @@ class Application(Gtk.Application):
     def queue(self):
         return self.__queue
 
+    @GObject.Property(type=Library, default=None,
+                      flags=GObject.ParamFlags.READABLE)
+    def library(self):
+        return self.__library
+
+    @property
+    def art(self):
+        return self.__art
+
+    @property
+    def position(self):
+        return self.__position
+
     @GObject.Property(type=BeatWindow, default=None,
                       flags=GObject.ParamFlags.READABLE)
     def win(self):
@@ -116,6 +137,7 @@ class Application(Gtk.Application):
 
             MPRIS2(self)
             MediaKeys(self)
+            self.__library.start()
             if not self.__window.get_current_playlist():
                 self.__window.create_playlist_tab(_("new playlist"))
         self.__window.present()
@@ -0,0 +1,103 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from gi.repository import GdkPixbuf, GLib
+
+from beat.utils.art_info import ArtInfo
+
+
+__all__ = ["ArtService"]
+
+
+THUMB_SIZES = (32, 256)
+LRU_SIZE = 512
+NEGATIVE_SIZE = 1024
+
+
+class ArtService:
+    def __init__(self, workers=2):
+        self.__executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="beat-art")
+        self.__thumbs_dir = Path(GLib.get_user_cache_dir(), "beat", "thumbs")
+        self.__resolved = OrderedDict()
+        self.__pending = {}
+        self.__no_cover_dirs = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def lookup(self, track_path, size=None):
+        if track_path not in self.__resolved:
+            return False, None
+
+        self.__resolved.move_to_end(track_path)
+        return True, self.__get_path_for_size(self.__resolved[track_path], size)
+
+    def request(self, track_path, callback, size=None):
+        found, path = self.lookup(track_path, size)
+        if found:
+            callback(track_path, path)
+            return
+
+        callbacks = self.__pending.get(track_path)
+        if callbacks is not None:
+            callbacks.append((callback, size))
+            return
+
+        self.__pending[track_path] = [(callback, size)]
+        self.__executor.submit(self.__resolve, track_path)
+
+    def __get_path_for_size(self, image_path, size):
+        if not image_path or size not in THUMB_SIZES:
+            return image_path
+
+        thumb_path = Path(self.__thumbs_dir, str(size), Path(image_path).name + ".png")
+        if thumb_path.exists():
+            return str(thumb_path)
+        return image_path
+
+    def __has_no_cover(self, directory):
+        with self.__lock:
+            return directory in self.__no_cover_dirs
+
+    def __set_no_cover(self, directory):
+        with self.__lock:
+            self.__no_cover_dirs[directory] = True
+            if len(self.__no_cover_dirs) > NEGATIVE_SIZE:
+                self.__no_cover_dirs.popitem(last=False)
+
+    def __make_thumbs(self, image_path):
+        name = Path(image_path).name + ".png"
+        for size in THUMB_SIZES:
+            thumb_path = Path(self.__thumbs_dir, str(size), name)
+            if thumb_path.exists():
+                continue
+            thumb_path.parent.mkdir(parents=True, exist_ok=True)
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(image_path, size, size, True)
+            pixbuf.savev(str(thumb_path), "png", [], [])
+
+    def __resolve(self, track_path):
+        # runs in the worker pool, must not touch widgets
+        directory = str(Path(track_path).parent)
+        image_path = None
+        try:
+            scan_dir = not self.__has_no_cover(directory)
+            image_path = ArtInfo(track_path).get_image_path(scan_dir=scan_dir)
+            if image_path:
+                self.__make_thumbs(image_path)
+            elif scan_dir:
+                self.__set_no_cover(directory)
+        except Exception as e:
+            print(f"Unable to resolve art for {track_path}: {e}")
+
+        GLib.idle_add(self.__deliver, track_path, image_path)
+
+    def __deliver(self, track_path, image_path):
+        self.__resolved[track_path] = image_path
+        self.__resolved.move_to_end(track_path)
+        if len(self.__resolved) > LRU_SIZE:
+            self.__resolved.popitem(last=False)
+
+        for callback, size in self.__pending.pop(track_path, []):
+            callback(track_path, self.__get_path_for_size(image_path, size))
+
+        return False
@@ -0,0 +1,155 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from gi.repository import GObject, GLib
+
+from beat.utils.tag_cache import TagCache
+from beat.utils.track_info import TrackInfo
+
+
+__all__ = ["TrackImporter"]
+
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 100
+
+
+class TrackImporter(GObject.GObject):
+    __gsignals__ = {
+        "rows-ready": (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        "progress": (GObject.SignalFlags.RUN_FIRST, None, (int, int)),
+        "finished": (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+    }
+
+    def __init__(self, paths, workers=None, library=None):
+        super().__init__()
+        self.__paths = [str(p) for p in paths]
+        self.__library = library
+        self.__cancelled = threading.Event()
+        self.__pending = deque()
+        self.__found = 0
+        self.__parsed = 0
+        self.__source_id = None
+        self.__executor = ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 2),
+                                             thread_name_prefix="beat-import")
+
+    @property
+    def found(self):
+        return self.__found
+
+    @property
+    def parsed(self):
+        return self.__parsed
+
+    def start(self):
+        thread = threading.Thread(target=self.__scan, name="beat-scan")
+        thread.daemon = True
+        thread.start()
+        self.__source_id = GLib.timeout_add(FLUSH_INTERVAL, self.__flush)
+
+    def cancel(self):
+        if self.__cancelled.is_set():
+            return
+        self.__cancelled.set()
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+        if self.__source_id:
+            GLib.source_remove(self.__source_id)
+            self.__source_id = None
+        self.emit("finished", True)
+
+    def __iter_files(self, path):
+        if os.path.isfile(path):
+            yield path
+            return
+
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        subdirs.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+            stack.extend(reversed(subdirs))
+
+    def __scan(self):
+        for path in self.__paths:
+            if self.__library and os.path.isdir(path) and self.__library.is_indexed(path):
+                # already indexed, take the rows without walking or parsing
+                for row in self.__library.iter_rows(path):
+                    if self.__cancelled.is_set():
+                        return
+                    self.__pending.append(row)
+                    self.__found += 1
+                continue
+
+            for filepath in self.__iter_files(path):
+                if self.__cancelled.is_set():
+                    return
+                try:
+                    future = self.__executor.submit(self.__parse, filepath)
+                except RuntimeError:
+                    return
+                self.__pending.append(future)
+                self.__found += 1
+
+        self.__pending.append(None)
+
+    def __parse(self, filepath):
+        if self.__cancelled.is_set():
+            return None
+
+        try:
+            info = TrackInfo(filepath)
+        except Exception:
+            return None
+
+        return info.to_row()
+
+    def __flush(self):
+        rows = []
+        finished = False
+        while self.__pending and len(rows) < BATCH_SIZE:
+            future = self.__pending[0]
+            if future is None:
+                finished = True
+                break
+            if isinstance(future, Future):
+                if not future.done():
+                    break
+                row = future.result()
+            else:
+                row = future
+            self.__pending.popleft()
+            self.__parsed += 1
+            if row:
+                rows.append(row)
+
+        if rows:
+            self.emit("rows-ready", rows)
+
+        if self.__cancelled.is_set():
+            return False
+
+        self.emit("progress", self.__parsed, self.__found)
+
+        if finished:
+            self.__source_id = None
+            self.__executor.shutdown(wait=False)
+            TagCache.get_default().flush()
+            self.emit("finished", False)
+            return False
+
+        return True
@@ -2,6 +2,7 @@ from gi.repository import AppIndicator3, Gtk, Gdk
 from gettext import gettext as _
 
 from beat.components.player import Playback
+from beat.utils.track_info import TrackInfo
 
 __all__ = ["StatusIndicator"]
 
@@ -21,6 +22,8 @@ class StatusIndicator:
         self.__pause_label = _('Pause')
 
         menu = Gtk.Menu()
+        self.__item_time = Gtk.MenuItem("")
+        self.__item_time.set_sensitive(False)
         self.__item_play = Gtk.MenuItem(self.__play_label)
         item_next = Gtk.MenuItem(_('Next'))
         item_prev = Gtk.MenuItem(_('Prev'))
@@ -31,6 +34,7 @@ class StatusIndicator:
         item_prev.connect("activate", self.__prev)
         item_show.connect("activate", self.__show)
         item_quit.connect("activate", self.__quit)
+        menu.append(self.__item_time)
         menu.append(self.__item_play)
         menu.append(item_next)
         menu.append(item_prev)
@@ -38,6 +42,8 @@ class StatusIndicator:
         menu.append(item_show)
         menu.append(item_quit)
         menu.show_all()
+        self.__item_time.hide()
+        self.__app.position.connect("tick", self.__on_position_tick)
         self.__indicator.set_menu(menu)
         self.__indicator.set_secondary_activate_target(item_show)
         #self.__indicator.connect("scroll-event", self.__on_scroll)
@@ -50,6 +56,18 @@ class StatusIndicator:
         else:
             self.__item_play.set_label(self.__play_label)
 
+    def __on_position_tick(self, position):
+        if self.__app.props.queue.props.player.props.state not in (Playback.PLAYING, Playback.PAUSED):
+            self.__item_time.hide()
+            return
+
+        label = TrackInfo.get_time_str(position.position)
+        if position.duration > 0:
+            label = f"{label} / {TrackInfo.get_time_str(position.duration)}"
+        if self.__item_time.get_label() != label:
+            self.__item_time.set_label(label)
+        self.__item_time.show()
+
     def __play(self, item):
         self.__app.props.queue.play()
 
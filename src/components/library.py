@@ -0,0 +1,225 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from gi.repository import Gio, GLib, GObject
+
+from beat.utils.tag_cache import TagCache
+from beat.utils.track_info import TrackInfo
+
+
+__all__ = ["Library", "AUDIO_EXTENSIONS"]
+
+
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".oga", ".opus", ".flac", ".m4a", ".mp4",
+                    ".aac", ".wav", ".wma", ".aif", ".aiff")
+
+UPDATE_DELAY = 500
+BATCH_SIZE = 500
+
+DIRTY_EVENTS = (
+    Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+    Gio.FileMonitorEvent.CREATED,
+    Gio.FileMonitorEvent.DELETED,
+    Gio.FileMonitorEvent.MOVED_IN,
+    Gio.FileMonitorEvent.MOVED_OUT,
+    Gio.FileMonitorEvent.RENAMED,
+)
+
+
+def is_audio_file(path):
+    return path.lower().endswith(AUDIO_EXTENSIONS)
+
+
+def _is_under(path, directory):
+    return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+
+class Library(GObject.GObject):
+    # Music roots indexed into the tag cache database. A root is walked once
+    # per session comparing mtime and size with the index, afterwards every
+    # directory is watched and only the reported paths are reindexed.
+
+    __gsignals__ = {
+        "changed": (GObject.SignalFlags.RUN_FIRST, None, ()),
+        "scan-finished": (GObject.SignalFlags.RUN_FIRST, None, (str,)),
+    }
+
+    def __init__(self):
+        super().__init__()
+        self.__cache = TagCache.get_default()
+        self.__roots = self.__cache.get_library_roots()
+        self.__indexed = set()
+        self.__monitors = {}
+        self.__dirty = set()
+        self.__update_source = None
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="beat-library")
+
+    @property
+    def roots(self):
+        return list(self.__roots)
+
+    def start(self):
+        for root in self.__roots:
+            self.__executor.submit(self.__scan, root, root)
+
+    def add_root(self, path):
+        path = os.path.abspath(path)
+        if not os.path.isdir(path) or self.get_root(path):
+            return
+
+        self.__roots.append(path)
+        self.__cache.add_library_root(path)
+        self.__executor.submit(self.__scan, path, path)
+
+    def remove_root(self, path):
+        path = os.path.abspath(path)
+        if path not in self.__roots:
+            return
+
+        self.__roots.remove(path)
+        self.__indexed.discard(path)
+        self.__unwatch(path)
+        self.__executor.submit(self.__cache.remove_library_root, path)
+        self.emit("changed")
+
+    def get_root(self, path):
+        path = os.path.abspath(path)
+        for root in self.__roots:
+            if _is_under(path, root):
+                return root
+
+    def is_indexed(self, path):
+        root = self.get_root(path)
+        return root is not None and root in self.__indexed
+
+    def iter_rows(self, directory):
+        # safe to call from any thread
+        for path, tags in self.__cache.get_library_tags(os.path.abspath(directory)):
+            yield TrackInfo.from_tags(path, tags).to_row()
+
+    def __scan(self, root, directory):
+        # runs in the library thread
+        known = self.__cache.get_library_stats(root)
+        seen = set()
+        changed = []
+        directories = []
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            directories.append(current)
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        stack.append(entry.path)
+                    elif entry.is_file() and is_audio_file(entry.name):
+                        stat = entry.stat()
+                        seen.add(entry.path)
+                        if known.get(entry.path) != (stat.st_mtime_ns, stat.st_size):
+                            changed.append((entry.path, stat))
+                except OSError:
+                    continue
+
+        removed = [p for p in known if _is_under(p, directory) and p not in seen]
+        self.__index(root, changed)
+        self.__cache.remove_library_tracks(removed)
+        GLib.idle_add(self.__on_scan_done, root, directories, bool(changed or removed))
+
+    def __index(self, root, tracks):
+        indexed = []
+        for path, stat in tracks:
+            try:
+                TrackInfo(path)
+            except Exception as e:
+                print(f"Unable to index {path}: {e}")
+                continue
+
+            indexed.append((path, stat))
+            if len(indexed) >= BATCH_SIZE:
+                self.__cache.store_library_tracks(root, indexed)
+                indexed = []
+
+        self.__cache.store_library_tracks(root, indexed)
+        self.__cache.flush()
+
+    def __update(self, paths):
+        # runs in the library thread
+        changed = False
+        for path in paths:
+            root = self.get_root(path)
+            if root is None:
+                continue
+
+            if os.path.isdir(path):
+                self.__scan(root, path)
+            elif os.path.isfile(path):
+                if is_audio_file(path):
+                    self.__index(root, [(path, os.stat(path))])
+                    changed = True
+            else:
+                self.__cache.remove_library_tracks([path])
+                self.__cache.remove_library_prefix(path)
+                changed = True
+
+        if changed:
+            GLib.idle_add(self.__emit_changed)
+
+    def __emit_changed(self):
+        self.emit("changed")
+        return False
+
+    def __on_scan_done(self, root, directories, changed):
+        if root in self.__roots:
+            for directory in directories:
+                self.__watch(directory)
+            self.__indexed.add(root)
+
+        if changed:
+            self.emit("changed")
+        self.emit("scan-finished", root)
+        return False
+
+    def __watch(self, directory):
+        if directory in self.__monitors:
+            return
+
+        try:
+            monitor = Gio.File.new_for_path(directory).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except GLib.Error as e:
+            print(f"Unable to watch {directory}: {e.message}")
+            return
+
+        monitor.connect("changed", self.__on_monitor_changed)
+        self.__monitors[directory] = monitor
+
+    def __unwatch(self, directory):
+        for path in [p for p in self.__monitors if _is_under(p, directory)]:
+            self.__monitors.pop(path).cancel()
+
+    def __on_monitor_changed(self, _monitor, file, other_file, event):
+        if event not in DIRTY_EVENTS:
+            return
+
+        self.__dirty.add(file.get_path())
+        if other_file is not None:
+            self.__dirty.add(other_file.get_path())
+
+        if self.__update_source is None:
+            self.__update_source = GLib.timeout_add(UPDATE_DELAY, self.__flush_dirty)
+
+    def __flush_dirty(self):
+        self.__update_source = None
+        paths, self.__dirty = self.__dirty, set()
+        paths.discard(None)
+        for path in paths:
+            if path in self.__monitors and not os.path.isdir(path):
+                self.__unwatch(path)
+
+        self.__executor.submit(self.__update, sorted(paths))
+        return False
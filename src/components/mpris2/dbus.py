@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 from gi.repository import Gio, GLib
 
@@ -6,6 +7,9 @@ from gi.repository import Gio, GLib
 __all__ = ['DBusInterface']
 
 
+PROPERTIES_IFACE = 'org.freedesktop.DBus.Properties'
+
+
 def camelcase_to_snake_case(name):
     s1 = re.sub('(.)([A-Z][a-z]+)', r'\1_\2', name)
     method_name = re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
@@ -15,17 +19,37 @@ def camelcase_to_snake_case(name):
     return method_name
 
 
+@lru_cache(maxsize=None)
+def load_introspection(xml_resource):
+    xml_res = Gio.File.new_for_uri(xml_resource)
+    xml_doc = xml_res.load_bytes(None)[0].get_data().decode()
+    return xml_doc, Gio.DBusNodeInfo.new_for_xml(xml_doc)
+
+
 class DBusInterface:
     def __init__(self, app_id, xml_resource):
         self.__path = "/org/mpris/MediaPlayer2"
         self.__name = f"org.mpris.MediaPlayer2.{app_id}"
-        self.__signals = None
         self.__con = None
-        self.__method_inargs = None
-        self.__method_outargs = None
-        self.__xml_resource = xml_resource
-        self.__xml_doc = None
+        self.__xml_doc, self.__node_info = load_introspection(xml_resource)
+        self.__properties = {}
 
+        # (interface, method) -> (bound method, fd argument indexes, output signature)
+        self.__methods = {}
+        self.__signals = {}
+        for interface in self.__node_info.interfaces:
+            for method in interface.methods:
+                callback = getattr(self, camelcase_to_snake_case(method.name), None)
+                if callback is None:
+                    continue
+                fd_args = tuple(i for i, arg in enumerate(method.in_args) if arg.signature == 'h')
+                out_args = "".join(arg.signature for arg in method.out_args)
+                self.__methods[(interface.name, method.name)] = (
+                    callback, fd_args, f"({out_args})" if out_args else None)
+
+            for signal in interface.signals:
+                self.__signals[signal.name] = (
+                    interface.name, tuple((arg.name, arg.signature) for arg in signal.args))
 
         Gio.bus_get(Gio.BusType.SESSION, None, self.__bus_get_sync, self.__name)
 
@@ -39,34 +63,11 @@ class DBusInterface:
         Gio.bus_own_name_on_connection(
             self.__con, name, Gio.BusNameOwnerFlags.NONE, None, None)
 
-        method_outargs = {}
-        method_inargs = {}
-        signals = {}
-
-        xml_res = Gio.File.new_for_uri(self.__xml_resource)
-        self.__xml_doc = xml_res.load_bytes(None)[0].get_data().decode()
-
-        for interface in Gio.DBusNodeInfo.new_for_xml(self.__xml_doc).interfaces:
-
-            for method in interface.methods:
-                method_outargs[method.name] = "(" + "".join(
-                    [arg.signature for arg in method.out_args]) + ")"
-                method_inargs[method.name] = tuple(
-                    arg.signature for arg in method.in_args)
-
-            for signal in interface.signals:
-                args = {arg.name: arg.signature for arg in signal.args}
-                signals[signal.name] = {
-                    'interface': interface.name, 'args': args}
-
+        for interface in self.__node_info.interfaces:
             self.__con.register_object(
                 object_path=self.__path, interface_info=interface,
                 method_call_closure=self.__on_method_call)
 
-        self.__method_inargs = method_inargs
-        self.__method_outargs = method_outargs
-        self.__signals = signals
-
     def __on_method_call(
         self, connection, sender, object_path, interface_name, method_name,
             parameters, invocation):
@@ -80,43 +81,64 @@ class DBusInterface:
         :param GLib.Variant parameters: parameters of the method invocation
         :param Gio.DBusMethodInvocation invocation: invocation
         """
-        args = list(parameters.unpack())
-        for i, sig in enumerate(self.__method_inargs[method_name]):
-            if sig == 'h':
-                msg = invocation.get_message()
-                fd_list = msg.get_unix_fd_list()
+        try:
+            callback, fd_args, out_args = self.__methods[(interface_name, method_name)]
+        except KeyError:
+            invocation.return_dbus_error(
+                "org.freedesktop.DBus.Error.UnknownMethod",
+                f"{interface_name}.{method_name} is not implemented")
+            return
+
+        args = parameters.unpack()
+        if fd_args:
+            args = list(args)
+            fd_list = invocation.get_message().get_unix_fd_list()
+            for i in fd_args:
                 args[i] = fd_list.get(args[i])
 
-        method_snake_name = camelcase_to_snake_case(method_name)
         try:
-            result = getattr(self, method_snake_name)(*args)
+            result = callback(*args)
         except ValueError as e:
             invocation.return_dbus_error(interface_name, str(e))
             return
 
-        result = (result,)
-        out_args = self.__method_outargs[method_name]
-        if out_args != '()':
-            variant = GLib.Variant(out_args, result)
-            invocation.return_value(variant)
+        if out_args:
+            invocation.return_value(GLib.Variant(out_args, (result,)))
         else:
             invocation.return_value(None)
 
+    def register_properties(self, interface_name, getters):
+        # getters maps property names to callables returning a GLib.Variant
+        self.__properties[interface_name] = getters
+
+    def get(self, interface_name, property_name):
+        try:
+            getter = self.__properties[interface_name][property_name]
+        except KeyError:
+            msg = f"{property_name} property from {interface_name} interface is not handled"
+            print(msg)
+            raise ValueError(msg)
+
+        return getter()
+
+    def get_all(self, interface_name):
+        getters = self.__properties.get(interface_name)
+        if getters is None:
+            if interface_name != PROPERTIES_IFACE:
+                print(f"{interface_name} interface has no properties")
+            return {}
+
+        return {name: getter() for name, getter in getters.items()}
+
     def dbus_emit_signal(self, signal_name, values):
-        if self.__signals is None:
+        if self.__con is None:
             return
 
-        signal = self.__signals[signal_name]
-        parameters = []
-        for arg_name, arg_signature in signal['args'].items():
-            value = values[arg_name]
-            parameters.append(GLib.Variant(arg_signature, value))
-
-        variant = GLib.Variant.new_tuple(*parameters)
+        interface_name, args = self.__signals[signal_name]
+        variant = GLib.Variant.new_tuple(
+            *[GLib.Variant(signature, values[name]) for name, signature in args])
         self.__con.emit_signal(
-            None, self.__path, signal['interface'], signal_name, variant)
+            None, self.__path, interface_name, signal_name, variant)
 
     def introspect(self):
         return self.__xml_doc
-
-    
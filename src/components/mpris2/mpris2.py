@@ -1,8 +1,9 @@
+from collections import OrderedDict
+
 from gi.repository import GLib
 
 from beat.components.mpris2.dbus import DBusInterface
 from beat.components.queue_manager import QueueState
-from beat.utils.art_info import ArtInfo
 
 
 MEDIA_PLAYER2_IFACE = 'org.mpris.MediaPlayer2'
@@ -13,6 +14,20 @@ MEDIA_PLAYER2_PLAYLISTS_IFACE = 'org.mpris.MediaPlayer2.Playlists'
 
 xml_resource = "resource:///ru/slie/beat/mpris2.xml"
 
+NO_TRACK_PATH = "/org/mpris/MediaPlayer2/TrackList/NoTrack"
+TRACK_PATH_PREFIX = "/ru/slie/beat/TrackList/"
+PLAYLIST_PATH_PREFIX = "/ru/slie/beat/Playlist/"
+
+# Tracks only exposes this many rows around the current one
+TRACKLIST_WINDOW = 500
+METADATA_CACHE_SIZE = 1024
+
+TRACK_KEYS = ("src", "artist", "album", "title", "length")
+
+
+def _uuid_to_path(uuid):
+    return uuid.replace("-", "_")
+
 
 class MPRIS2(DBusInterface):
     def __init__(self, app):
@@ -20,24 +35,58 @@ class MPRIS2(DBusInterface):
         self.__app = app
         self.__queue = self.__app.props.queue
         self.__player = self.__queue.props.player
+        self.__metadata = None
+        self.__tracks_metadata = OrderedDict()
+        self.__tracklist_window = None
+        self.__can_go_next = False
+        self.__can_go_previous = False
+        self.__changed = set()
+        self.__changed_source = None
+        self.__position = self.__app.position
         self.__queue.connect("song-changed", self.__on_song_changed)
         self.__queue.connect("notify::state", self.__on_state_changed)
+        self.__player.connect("notify::duration", self.__on_duration_changed)
+        self.__register_properties()
+
+    def __queue_changed(self, *names, interface_name=MEDIA_PLAYER2_PLAYER_IFACE):
+        # coalesce bursts of changes into one PropertiesChanged per main loop iteration
+        self.__changed.update((interface_name, name) for name in names)
+        if self.__changed_source is None:
+            self.__changed_source = GLib.idle_add(self.__emit_changed)
+
+    def __emit_changed(self):
+        self.__changed_source = None
+        changed, self.__changed = self.__changed, set()
+        interfaces = {}
+        for interface_name, name in changed:
+            interfaces.setdefault(interface_name, []).append(name)
+
+        for interface_name, names in interfaces.items():
+            self.properties_changed(interface_name,
+                                    {name: self.get(interface_name, name) for name in names}, [])
+        return False
 
     def __on_state_changed(self, queue, _state):
-        playback_status = self.__get_playback_status()
-        self.properties_changed(
-            MEDIA_PLAYER2_PLAYER_IFACE,
-            {'PlaybackStatus': GLib.Variant('s', playback_status), }, [])
+        self.__queue_changed("PlaybackStatus")
 
     def __on_song_changed(self, queue):
-        properties = {}
-        properties["Metadata"] = GLib.Variant("a{sv}", self.__get_metadata())
-        properties["CanGoNext"] = GLib.Variant("b", self.__queue.has_next)
-        properties["CanGoPrevious"] = GLib.Variant("b", self.__queue.has_prev)
-        properties["CanPause"] = GLib.Variant("b", True)
-        properties["CanPlay"] = GLib.Variant("b", True)
+        self.__metadata = None
+        self.__can_go_next = self.__queue.has_next
+        self.__can_go_previous = self.__queue.has_prev
+        self.__queue_changed("Metadata", "CanGoNext", "CanGoPrevious", "CanPause", "CanPlay")
+        self.__queue_changed("ActivePlaylist", interface_name=MEDIA_PLAYER2_PLAYLISTS_IFACE)
+        self.__update_tracklist()
 
-        self.properties_changed(MEDIA_PLAYER2_PLAYER_IFACE, properties, [])
+    def __on_duration_changed(self, player, _duration):
+        self.__metadata = None
+        self.__queue_changed("Metadata")
+
+    def __on_art_ready(self, track_path, image_path):
+        if not image_path or track_path != self.__queue.active_track_path:
+            return
+
+        self.__metadata = None
+        self.__queue_changed("Metadata")
 
     def __get_playback_status(self):
         state = self.__queue.props.state
@@ -50,112 +99,195 @@ class MPRIS2(DBusInterface):
 
     def __get_song_dbus_path(self, ref=None):
         if not ref or not ref.valid():
-            return "/org/mpris/MediaPlayer2/TrackList/NoTrack"
-
-        store = ref.get_model().uuid
-        index = ref.get_path().get_indices()[0]
+            return NO_TRACK_PATH
+
+        return self.__get_track_dbus_path(ref.store, ref.row_id)
+
+    def __get_track_dbus_path(self, model, row_id):
+        return f"{TRACK_PATH_PREFIX}{_uuid_to_path(model.uuid)}/{row_id}"
+
+    def __get_playlist_dbus_path(self, playlist):
+        return PLAYLIST_PATH_PREFIX + _uuid_to_path(playlist.uuid)
+
+    def __get_playlists(self):
+        return {_uuid_to_path(p.uuid): p for p in self.__app.props.win.get_playlists()}
+
+    def __find_playlist(self, playlist_id, playlists=None):
+        if not playlist_id.startswith(PLAYLIST_PATH_PREFIX):
+            return None
+        if playlists is None:
+            playlists = self.__get_playlists()
+        return playlists.get(playlist_id[len(PLAYLIST_PATH_PREFIX):])
+
+    def __find_track(self, track_id, playlists=None):
+        if not track_id.startswith(TRACK_PATH_PREFIX):
+            return None, None
+
+        key, _sep, row_id = track_id[len(TRACK_PATH_PREFIX):].partition("/")
+        if playlists is None:
+            playlists = self.__get_playlists()
+        playlist = playlists.get(key)
+        if playlist is None or not row_id.isdigit():
+            return None, None
+
+        return playlist, int(row_id)
+
+    def __get_track_metadata(self, model, row_id):
+        key = (model.uuid, row_id)
+        metadata = self.__tracks_metadata.get(key)
+        if metadata is not None:
+            # row ids are never reused within a playlist, even when its store is
+            # replaced, a removed row only has to be forgotten
+            if not model.has_id(row_id):
+                del self.__tracks_metadata[key]
+                return None
+            self.__tracks_metadata.move_to_end(key)
+            return metadata
+
+        values = model.get_values_for_id(row_id, TRACK_KEYS)
+        if values is None:
+            return None
+
+        track_path, artist, album, title, length = values
+        metadata = {
+            'mpris:trackid': GLib.Variant('o', self.__get_track_dbus_path(model, row_id)),
+            'xesam:url': GLib.Variant('s', GLib.filename_to_uri(track_path, None)),
+            'mpris:length': GLib.Variant('x', int((length or 0) * 1e6)),
+            'xesam:album': GLib.Variant('s', album),
+            'xesam:title': GLib.Variant('s', title),
+            'xesam:artist': GLib.Variant('as', [artist]),
+            'xesam:albumArtist': GLib.Variant('as', [artist])
+        }
 
-        return f"/ru/slie/beat/tracklist/{strore}_{index}"
+        self.__tracks_metadata[key] = metadata
+        if len(self.__tracks_metadata) > METADATA_CACHE_SIZE:
+            self.__tracks_metadata.popitem(last=False)
+        return metadata
 
     def __get_metadata(self):
+        if self.__metadata is None:
+            self.__metadata = GLib.Variant("a{sv}", self.__build_metadata())
+        return self.__metadata
+
+    def __build_metadata(self):
         ref = self.__queue.active_ref
-        song_dbus_path = self.__get_song_dbus_path()
+        model = ref.store if ref and ref.valid() else None
+        metadata = model and self.__get_track_metadata(model, ref.row_id)
 
-        if not ref or not ref.valid():
+        if not metadata:
             return {
-                'mpris:trackid': GLib.Variant('o', song_dbus_path)
+                'mpris:trackid': GLib.Variant('o', NO_TRACK_PATH)
             }
 
-        model = ref.get_model()
+        metadata = dict(metadata)
+        duration = self.__player.props.duration
+        if duration > 0:
+            metadata['mpris:length'] = GLib.Variant('x', int(duration * 1e6))
 
-        length = self.__player.props.duration * 1e6
-        artist = model.get_artist_for_ref(ref)
-        album = model.get_album_for_ref(ref)
-        title = model.get_title_for_ref(ref)
         track_path = model.get_track_path_for_ref(ref)
-
-        metadata = {
-            'mpris:trackid': GLib.Variant('o', song_dbus_path),
-            'xesam:url': GLib.Variant('s', model.get_artist_for_ref(ref)),
-            'mpris:length': GLib.Variant('x', length),
-            'xesam:album': GLib.Variant('s', album),
-            'xesam:title': GLib.Variant('s', title),
-            'xesam:artist': GLib.Variant('as', [artist]),
-            'xesam:albumArtist': GLib.Variant('as', [artist])
-        }
-
-        image_path = ArtInfo(track_path).get_image_path()
-        if image_path:
-            metadata['mpris:artUrl'] = GLib.Variant('s', "file://" + image_path)
+        found, image_path = self.__app.art.lookup(track_path, 256)
+        if not found:
+            self.__app.art.request(track_path, self.__on_art_ready, 256)
+        elif image_path:
+            metadata['mpris:artUrl'] = GLib.Variant('s', GLib.filename_to_uri(image_path, None))
 
         return metadata
 
-    def get_all(self, interface_name):
-        if interface_name == MEDIA_PLAYER2_IFACE:
-            application_id = self.__app.props.application_id
-            return {
-                'CanQuit': GLib.Variant('b', True),
-                'Fullscreen': GLib.Variant('b', False),
-                'CanRaise': GLib.Variant('b', True),
-                'HasTrackList': GLib.Variant('b', True),
-                'Identity': GLib.Variant('s', 'Beat'),
-                'DesktopEntry': GLib.Variant('s', application_id),
-                'SupportedUriSchemes': GLib.Variant('as', [
-                    'file'
-                ]),
-                'SupportedMimeTypes': GLib.Variant('as', [
-                    'application/ogg',
-                    'audio/x-vorbis+ogg',
-                    'audio/x-flac',
-                    'audio/mpeg'
-                ]),
-            }
-        elif interface_name == MEDIA_PLAYER2_PLAYER_IFACE:
-            position_msecond = int(self.__player.position * 1e6)
-            playback_status = self.__get_playback_status()
-            # TODO: can play
-            can_play = True
-            has_previous = self.__queue.has_prev
-            return {
-                'PlaybackStatus': GLib.Variant('s', playback_status),
-                'Metadata': GLib.Variant('a{sv}', self.__get_metadata()),
-                'Position': GLib.Variant('x', position_msecond),
-                'CanGoNext': GLib.Variant('b', self.__queue.has_next),
-                'CanGoPrevious': GLib.Variant('b', has_previous),
-                'CanPlay': GLib.Variant('b', can_play),
-                'CanPause': GLib.Variant('b', can_play),
-                'CanSeek': GLib.Variant('b', True),
-                'CanControl': GLib.Variant('b', True),
-            }
-        elif interface_name == MPRIS.MEDIA_PLAYER2_TRACKLIST_IFACE:
-            return {
-                'Tracks': GLib.Variant('ao', self._path_list),
-                'CanEditTracks': GLib.Variant('b', False)
-            }
-        elif interface_name == MPRIS.MEDIA_PLAYER2_PLAYLISTS_IFACE:
-            playlist_count = self._playlists_model.get_n_items()
-            active_playlist = self._get_active_playlist()
-            return {
-                'PlaylistCount': GLib.Variant('u', playlist_count),
-                'Orderings': GLib.Variant('as', ['Alphabetical']),
-                'ActivePlaylist': GLib.Variant('(b(oss))', active_playlist),
-            }
-        elif interface_name == 'org.freedesktop.DBus.Properties':
-            return {}
-        elif interface_name == 'org.freedesktop.DBus.Introspectable':
-            return {}
+    def __get_tracklist_window(self):
+        ref = self.__queue.active_ref
+        if ref and ref.valid():
+            model = ref.store
+            index = model.get_index_for_ref(ref)
         else:
-            self._log.warning(
-                "MPRIS does not implement {} interface".format(interface_name))
-
-    def get(self, interface_name, property_name):
-        try:
-            return self.__get_all(interface_name)[property_name]
-        except KeyError:
-            msg = "MPRIS does not handle {} property from {} interface".format(
-                property_name, interface_name)
-            print(msg)
-            raise ValueError(msg)
+            playlist = self.__app.props.win.get_current_playlist()
+            if playlist is None:
+                return None, 0
+            model = playlist.store
+            index = 0
+
+        # the window moves in whole pages and only once the track leaves it,
+        # so most song changes don't replace the track list
+        current = self.__tracklist_window
+        if current is not None and current[0] is model and \
+                current[1] <= index < current[1] + TRACKLIST_WINDOW:
+            return model, current[1]
+        return model, index // TRACKLIST_WINDOW * TRACKLIST_WINDOW
+
+    def __get_tracks(self):
+        model, offset = self.__get_tracklist_window()
+        if model is None:
+            return []
+        return [self.__get_track_dbus_path(model, row_id)
+                for row_id in model.get_ids(offset, TRACKLIST_WINDOW)]
+
+    def __update_tracklist(self):
+        model, offset = self.__get_tracklist_window()
+        window = (model, offset)
+        if window == self.__tracklist_window:
+            return
+
+        self.__tracklist_window = window
+        self.dbus_emit_signal('TrackListReplaced', {
+            'Tracks': self.__get_tracks(),
+            'CurrentTrack': self.__get_song_dbus_path(self.__queue.active_ref)
+        })
+
+    def __get_active_playlist(self):
+        ref = self.__queue.active_ref
+        if ref and ref.valid():
+            uuid = ref.store.uuid
+            for playlist in self.__app.props.win.get_playlists():
+                if playlist.uuid == uuid:
+                    return True, (self.__get_playlist_dbus_path(playlist), playlist.label, "")
+
+        return False, ("/", "", "")
+
+    def __register_properties(self):
+        def constant(variant):
+            return lambda: variant
+
+        true = GLib.Variant('b', True)
+        false = GLib.Variant('b', False)
+        # TODO: can play
+        can_play = true
+
+        self.register_properties(MEDIA_PLAYER2_IFACE, {
+            'CanQuit': constant(true),
+            'Fullscreen': constant(false),
+            'CanRaise': constant(true),
+            'HasTrackList': constant(true),
+            'Identity': constant(GLib.Variant('s', 'Beat')),
+            'DesktopEntry': constant(GLib.Variant('s', self.__app.props.application_id)),
+            'SupportedUriSchemes': constant(GLib.Variant('as', [
+                'file'
+            ])),
+            'SupportedMimeTypes': constant(GLib.Variant('as', [
+                'application/ogg',
+                'audio/x-vorbis+ogg',
+                'audio/x-flac',
+                'audio/mpeg'
+            ])),
+        })
+        self.register_properties(MEDIA_PLAYER2_PLAYER_IFACE, {
+            'PlaybackStatus': lambda: GLib.Variant('s', self.__get_playback_status()),
+            'Metadata': self.__get_metadata,
+            'Position': lambda: GLib.Variant('x', int(self.__position.position * 1e6)),
+            'CanGoNext': lambda: GLib.Variant('b', self.__can_go_next),
+            'CanGoPrevious': lambda: GLib.Variant('b', self.__can_go_previous),
+            'CanPlay': constant(can_play),
+            'CanPause': constant(can_play),
+            'CanSeek': constant(true),
+            'CanControl': constant(true),
+        })
+        self.register_properties(MEDIA_PLAYER2_TRACKLIST_IFACE, {
+            'Tracks': lambda: GLib.Variant('ao', self.__get_tracks()),
+            'CanEditTracks': constant(true),
+        })
+        self.register_properties(MEDIA_PLAYER2_PLAYLISTS_IFACE, {
+            'PlaylistCount': lambda: GLib.Variant('u', len(self.__app.props.win.get_playlists())),
+            'Orderings': constant(GLib.Variant('as', ['Alphabetical', 'UserDefined'])),
+            'ActivePlaylist': lambda: GLib.Variant('(b(oss))', self.__get_active_playlist()),
+        })
 
     def set(self, interface_name, property_name, new_value):
         if interface_name == MEDIA_PLAYER2_IFACE:
@@ -199,3 +331,62 @@ class MPRIS2(DBusInterface):
 
     def play(self):
         self.__queue.play()
+
+    def get_tracks_metadata(self, track_ids):
+        playlists = self.__get_playlists()
+        tracks = []
+        for track_id in track_ids:
+            playlist, row_id = self.__find_track(track_id, playlists)
+            if playlist is None:
+                continue
+            metadata = self.__get_track_metadata(playlist.store, row_id)
+            if metadata:
+                tracks.append(metadata)
+        return tracks
+
+    def add_track(self, uri, after_track, set_as_current):
+        track_path = GLib.filename_from_uri(uri)[0]
+        playlist, row_id = self.__find_track(after_track)
+        position_iter = None
+        if playlist is None:
+            playlist = self.__app.props.win.get_current_playlist()
+        else:
+            position_iter = playlist.store.get_iter_for_id(row_id)
+
+        if playlist is not None:
+            playlist.add_tracks([track_path], position_iter, True, play=set_as_current)
+
+    def remove_track(self, track_id):
+        playlist, row_id = self.__find_track(track_id)
+        ref = playlist and playlist.store.get_ref_for_id(row_id)
+        if ref:
+            playlist.remove_refs([ref])
+
+    def go_to(self, track_id):
+        playlist, row_id = self.__find_track(track_id)
+        ref = playlist and playlist.store.get_ref_for_id(row_id)
+        if ref:
+            playlist.play(ref)
+
+    def activate_playlist(self, playlist_id):
+        playlist = self.__find_playlist(playlist_id)
+        if playlist is None:
+            raise ValueError(f"Unknown playlist {playlist_id}")
+
+        self.__app.props.win.select_playlist(playlist)
+        playlist.load()
+        ref = playlist.active_ref
+        if not ref or not ref.valid():
+            ref = playlist.get_first_and_select()
+        if ref:
+            playlist.play(ref)
+
+    def get_playlists(self, index, max_count, order, reverse_order):
+        playlists = self.__app.props.win.get_playlists()
+        if order == 'Alphabetical':
+            playlists.sort(key=lambda p: p.label.casefold())
+        if reverse_order:
+            playlists.reverse()
+
+        return [(self.__get_playlist_dbus_path(p), p.label, "")
+                for p in playlists[index:index + max_count]]
@@ -1,9 +1,13 @@
+import time
 from enum import IntEnum
 from pathlib import Path
 from gi.repository import Gst, GLib, Gtk, GObject
 
 
-__all__ = ["Player", "Playback"]
+__all__ = ["Player", "Playback", "SeekMode"]
+
+
+PLAY_FLAG_AUDIO = 1 << 1
 
 
 class Playback(IntEnum):
@@ -13,53 +17,67 @@ class Playback(IntEnum):
     PLAYING = 3
 
 
+class SeekMode(IntEnum):
+    FAST = 0
+    ACCURATE = 1
+
+
 class Player(GObject.GObject):
     __gsignals__ = {
-        "clock-tick": (GObject.SignalFlags.RUN_FIRST, None, (int, )),
-        "eos": (GObject.SignalFlags.RUN_FIRST, None, ())
+        "eos": (GObject.SignalFlags.RUN_FIRST, None, ()),
+        "track-changed": (GObject.SignalFlags.RUN_FIRST, None, (str, )),
+        "switch-latency": (GObject.SignalFlags.RUN_FIRST, None, (float, )),
+        "seeked": (GObject.SignalFlags.RUN_FIRST, None, (float, )),
     }
 
     def __init__(self, app):
         super().__init__()
         Gst.init(None)
 
-        self.__player = Gst.Pipeline.new("player")
-        self.__source = Gst.ElementFactory.make("filesrc", "file-source")
-        decodebin = Gst.ElementFactory.make('decodebin', 'decodebin')
+        self.__player = Gst.ElementFactory.make("playbin", "player")
+        self.__player.set_property("flags", PLAY_FLAG_AUDIO)
         audioconvert = Gst.ElementFactory.make('audioconvert', 'audioconvert')
 
-        spectrum = Gst.ElementFactory.make("spectrum", "spectrum")
-        spectrum.set_property("bands", 96)
-        spectrum.set_property("threshold", -80)
-        spectrum.set_property("interval", 50000000)
-        spectrum.set_property("post-messages", True)
-        spectrum.set_property('message-magnitude', True)
+        self.__spectrum = Gst.ElementFactory.make("spectrum", "spectrum")
+        self.__spectrum.set_property("bands", 96)
+        self.__spectrum.set_property("threshold", -80)
+        self.__spectrum.set_property("interval", 50000000)
+        self.__spectrum.set_property("post-messages", False)
+        self.__spectrum.set_property('message-magnitude', True)
 
         self.__volume = Gst.ElementFactory.make('volume', 'volume')
 
-        sink = Gst.ElementFactory.make('autoaudiosink', 'autoaudiosink')
+        audio_filter = Gst.Bin.new("audio-filter")
+        [audio_filter.add(k) for k in [audioconvert, self.__spectrum, self.__volume]]
+        audioconvert.link_filtered(self.__spectrum)
+        self.__spectrum.link(self.__volume)
+        audio_filter.add_pad(Gst.GhostPad.new("sink", audioconvert.get_static_pad("sink")))
+        audio_filter.add_pad(Gst.GhostPad.new("src", self.__volume.get_static_pad("src")))
 
-        def on_pad_added(_decodebin, pad):
-            pad.link(audioconvert.get_static_pad('sink'))
-
-        decodebin.connect('pad-added', on_pad_added)
+        sink = Gst.ElementFactory.make('autoaudiosink', 'autoaudiosink')
 
-        [self.__player.add(k) for k in [self.__source, decodebin, audioconvert, spectrum, self.__volume, sink]]
-        self.__source.link(decodebin)
-        audioconvert.link_filtered(spectrum)
-        spectrum.link(self.__volume)
-        self.__volume.link(sink)
+        self.__player.set_property("audio-filter", audio_filter)
+        self.__player.set_property("audio-sink", sink)
+        self.__player.connect("about-to-finish", self.__on_about_to_finish)
 
         self.__bus = self.__player.get_bus()
         self.__bus.add_signal_watch()
         self.__bus.connect('message::error', self.__on_bus_error)
         self.__bus.connect('message::eos', self.__on_bus_eos)
-        self.__bus.connect('message::new-clock', self.__on_new_clock)
+        self.__bus.connect('message::duration-changed', self.__on_bus_duration_changed)
         self.__bus.connect("message::state-changed", self.__on_state_changed)
         self.__bus.connect("message::stream-start", self.__on_bus_stream_start)
+        self.__bus.connect("message::async-done", self.__on_bus_async_done)
 
-        self.__tick = 0
+        self.__duration = -1
         self.__state = Playback.STOPPED
+        self.__track_path = None
+        self.__next_track_path = None
+        self.__pending_track_path = None
+        self.__gapless = True
+        self.__switch_started = None
+        self.__seeking = False
+        self.__seek_target = None
 
     @property
     def playbin(self):
@@ -72,28 +90,57 @@ class Player(GObject.GObject):
         else:
             self.props.duration = duration
 
-    def __on_new_clock(self, bus, message):
-        clock = message.parse_new_clock()
-        id_ = clock.new_periodic_id(0, 1 * Gst.SECOND)
-        clock.id_wait_async(id_, self.__on_clock_tick, None)
-
-    def __on_clock_tick(self, clock, time, id, data):
-        self.emit("clock-tick", self.__tick)
-        self.__tick += 1
+    def __on_bus_duration_changed(self, bus, message):
+        self.__query_duration()
 
     def __on_bus_stream_start(self, bus, message):
         def delayed_query():
             self.__query_duration()
-            self.__tick = 0
+            return False
 
         GLib.timeout_add(1, delayed_query)
 
+        pending_track_path, self.__pending_track_path = self.__pending_track_path, None
+        if pending_track_path:
+            self.__track_path = pending_track_path
+            self.emit("track-changed", pending_track_path)
+
+    def __on_bus_async_done(self, bus, message):
+        if not self.__seeking:
+            return
+
+        self.__seeking = False
+        if self.__seek_target is not None:
+            self.__do_seek()
+        else:
+            self.emit("seeked", self.query_position() or 0.0)
+
+    def __on_about_to_finish(self, playbin):
+        # called from a streaming thread
+        next_track_path = self.__next_track_path
+        if not self.__gapless or not next_track_path or not Path(next_track_path).exists():
+            return
+
+        self.__next_track_path = None
+        self.__pending_track_path = next_track_path
+        playbin.set_property("uri", Gst.filename_to_uri(next_track_path))
+
     def __on_state_changed(self, bus, message):
         if message.src != self.__player:
             return
 
         old_state, new_state, _ = message.parse_state_changed()
 
+        if new_state == Gst.State.PLAYING and self.__switch_started is not None:
+            self.emit("switch-latency", time.monotonic() - self.__switch_started)
+            self.__switch_started = None
+
+        # a flushing seek loses the PAUSED/PLAYING state on its own, a
+        # pending target must survive that until ASYNC_DONE
+        if new_state in (Gst.State.READY, Gst.State.NULL):
+            self.__seeking = False
+            self.__seek_target = None
+
         if new_state == Gst.State.PAUSED:
             self.__state = Playback.PAUSED
         elif new_state == Gst.State.PLAYING:
@@ -107,6 +154,7 @@ class Player(GObject.GObject):
 
     def __on_bus_error(self, bus, message):
         error, debug = message.parse_error()
+        self.__switch_started = None
         if error.matches(Gst.CoreError.quark(), Gst.CoreError.MISSING_PLUGIN):
             self.props.state = Playback.STOPPED
 
@@ -131,9 +179,14 @@ class Player(GObject.GObject):
             self.__player.set_state(Gst.State.PLAYING)
         self.__state = state
 
+    def query_position(self):
+        success, position = self.__player.query_position(Gst.Format.TIME)
+        if success:
+            return position / Gst.SECOND
+
     @GObject.Property
     def position(self):
-        return self.__player.query_position(Gst.Format.TIME)[1] / Gst.SECOND
+        return self.query_position() or 0.0
 
     @GObject.Property(type=float)
     def duration(self):
@@ -145,12 +198,31 @@ class Player(GObject.GObject):
     def duration(self, duration):
         self.__duration = duration
 
-    def set_position_by_percent(self, progress) -> bool:
-        status_duration, duration = self.__player.query_duration(Gst.Format.TIME)
-        if status_duration:
-            self.__player.seek_simple(Gst.Format.TIME,
-                                      Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT,
-                                      duration / 100 * progress)
+    def __do_seek(self):
+        position, mode = self.__seek_target
+        self.__seek_target = None
+        flags = Gst.SeekFlags.FLUSH
+        if mode == SeekMode.ACCURATE:
+            flags |= Gst.SeekFlags.ACCURATE
+        else:
+            flags |= Gst.SeekFlags.KEY_UNIT | Gst.SeekFlags.SNAP_NEAREST
+
+        self.__seeking = self.__player.seek_simple(Gst.Format.TIME, flags, int(position * Gst.SECOND))
+
+    def seek(self, position, mode=SeekMode.ACCURATE):
+        # only the latest target is kept while a flushing seek is in flight,
+        # it runs once the pipeline posts ASYNC_DONE
+        self.__seek_target = (max(position, 0), mode)
+        if not self.__seeking:
+            self.__do_seek()
+
+    def set_position_by_percent(self, progress, mode=SeekMode.ACCURATE) -> bool:
+        duration = self.props.duration
+        if duration <= 0:
+            return False
+
+        self.seek(duration / 100 * progress, mode)
+        return True
 
     def unpause(self):
         if self.props.state == Playback.PAUSED:
@@ -158,9 +230,17 @@ class Player(GObject.GObject):
 
     def play(self, filepath: str) -> bool:
         if filepath and Path(filepath).exists():
-            if self.__source.get_property("location") != filepath:
-                self.props.state = Playback.STOPPED
-                self.__source.set_property("location", filepath)
+            if self.__track_path != filepath:
+                # READY keeps the audio filter and sink allocated, only the
+                # source and decoder are rebuilt for the new uri
+                self.__switch_started = time.monotonic()
+                if self.__state > Playback.READY:
+                    self.props.state = Playback.READY
+                self.__pending_track_path = None
+                self.__seeking = False
+                self.__seek_target = None
+                self.__track_path = filepath
+                self.__player.set_property("uri", Gst.filename_to_uri(filepath))
             self.props.state = Playback.PLAYING
             return True
 
@@ -172,11 +252,35 @@ class Player(GObject.GObject):
         self.props.state = Playback.PAUSED
 
     def stop(self):
+        self.__switch_started = None
+        self.__seeking = False
+        self.__seek_target = None
         self.props.state = Playback.STOPPED
 
     def set_volume(self, volume: float):
         self.__volume.set_property('volume', volume)
 
+    def set_spectrum_enabled(self, enabled: bool):
+        if self.__spectrum.get_property("post-messages") != enabled:
+            self.__spectrum.set_property("post-messages", enabled)
+
+    def configure_spectrum(self, bands: int, interval: int):
+        if self.__spectrum.get_property("bands") != bands:
+            self.__spectrum.set_property("bands", bands)
+        if self.__spectrum.get_property("interval") != interval:
+            self.__spectrum.set_property("interval", interval)
+
+    def set_next_track(self, filepath):
+        self.__next_track_path = filepath
+
+    @GObject.Property(type=bool, default=True)
+    def gapless(self):
+        return self.__gapless
+
+    @gapless.setter
+    def gapless(self, gapless):
+        self.__gapless = gapless
+
     @property
     def track_path(self):
-        return self.__source.get_property("location")
+        return self.__track_path
@@ -0,0 +1,94 @@
+from gi.repository import GLib, GObject
+
+from beat.components.player import Playback
+
+
+__all__ = ["PositionService"]
+
+
+INTERVAL = 250
+HIDDEN_INTERVAL = 1000
+
+
+class PositionService(GObject.GObject):
+    # Samples the playback position on the main loop and keeps one snapshot
+    # for every reader. While nothing visible needs it, the pipeline is not
+    # queried and ticks only carry the extrapolated position.
+
+    __gsignals__ = {
+        "tick": (GObject.SignalFlags.RUN_FIRST, None, ()),
+    }
+
+    def __init__(self, player, interval=INTERVAL):
+        super().__init__()
+        self.__player = player
+        self.__interval = interval
+        self.__visible = True
+        self.__source = None
+        self.__position = 0.0
+        self.__sampled_at = 0
+        self.__playing = False
+        self.__player.connect("notify::state", self.__on_player_changed)
+        self.__player.connect("track-changed", self.__on_player_changed)
+        self.__player.connect("seeked", self.__on_player_changed)
+
+    def __sample(self):
+        position = self.__player.query_position()
+        self.__position = position if position is not None else 0.0
+        self.__sampled_at = GLib.get_monotonic_time()
+        self.__playing = self.__player.props.state == Playback.PLAYING
+
+    def __reschedule(self):
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+            self.__source = None
+
+        if self.__playing:
+            interval = self.__interval if self.__visible else HIDDEN_INTERVAL
+            self.__source = GLib.timeout_add(interval, self.__on_timeout)
+
+    def __on_timeout(self):
+        if self.__visible:
+            self.__sample()
+        self.emit("tick")
+        return True
+
+    def __on_player_changed(self, *args):
+        self.update()
+
+    def update(self):
+        self.__sample()
+        self.__reschedule()
+        self.emit("tick")
+
+    def set_visible(self, visible):
+        if self.__visible == visible:
+            return
+
+        self.__visible = visible
+        if visible:
+            self.__sample()
+        self.__reschedule()
+
+    @GObject.Property(type=int)
+    def interval(self):
+        return self.__interval
+
+    @interval.setter
+    def interval(self, interval):
+        self.__interval = interval
+        self.__reschedule()
+
+    @property
+    def position(self):
+        position = self.__position
+        if self.__playing:
+            position += (GLib.get_monotonic_time() - self.__sampled_at) / 1e6
+            duration = self.__player.props.duration
+            if duration > 0:
+                position = min(position, duration)
+        return position
+
+    @property
+    def duration(self):
+        return self.__player.props.duration
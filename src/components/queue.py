@@ -1,3 +1,5 @@
+from collections import Counter
+
 from gi.repository import GObject
 
 __all__ = ["TracksQueue"]
@@ -7,39 +9,33 @@ class TracksQueue(GObject.GObject):
     def __init__(self):
         super().__init__()
         self.__queue = []
-
-    def __index(self, ref):
-        for i, r in enumerate(self.__queue):
-            if r.get_model() != ref.get_model():
-                continue
-            if r.get_path() == ref.get_path():
-                return i
-        return -1
-
-    def __get_positions_for_ref(self, ref):
-        out = []
-        for i, r in enumerate(self.__queue, 1):
-            if r.get_model() != ref.get_model():
-                continue
-            if r.get_path() == ref.get_path():
-                out.append(str(i))
-
-        return ", ".join(out)
+        self.__labels = {}
 
     def __update_tracks_positions(self):
-        values = {}
-        for i, ref in enumerate(self.__queue[:]):
+        # refs are (store, row_id) values, labels are keyed by them directly
+        positions = {}
+        queue = []
+        for ref in self.__queue:
             if not ref or not ref.valid():
-                self.__queue.pop(i)
                 continue
+            queue.append(ref)
+            positions.setdefault(ref, []).append(str(len(queue)))
+        self.__queue = queue
+
+        labels = {ref: ", ".join(p) for ref, p in positions.items()}
+
+        changes = {}
+        for model, row_id in self.__labels.keys() - labels.keys():
+            changes.setdefault(model, {})[row_id] = None
 
-            model = ref.get_model()
-            model.update_position_for_ref(ref, self.__get_positions_for_ref(ref))
+        for (model, row_id), label in labels.items():
+            if self.__labels.get((model, row_id)) != label:
+                changes.setdefault(model, {})[row_id] = label
 
-    def __remove_track_position(self, ref):
-        if ref.valid():
-            model = ref.get_model()
-            model.update_position_for_ref(ref, None)
+        self.__labels = labels
+
+        for model, rows in changes.items():
+            model.update_positions(rows)
 
     def add(self, track_refs):
         if not track_refs:
@@ -55,17 +51,17 @@ class TracksQueue(GObject.GObject):
         if not track_refs:
             return
 
-        if isinstance(track_refs, (list, set)):
-            for ref in track_refs:
-                idx = self.__index(ref)
-                if idx > -1:
-                    self.__queue.pop(idx)
-                    self.__remove_track_position(ref)
-        else:
-            idx = self.__index(track_refs)
-            if idx > -1:
-                self.__queue.pop(idx)
-                self.__remove_track_position(track_refs)
+        if not isinstance(track_refs, (list, set)):
+            track_refs = [track_refs]
+
+        to_remove = Counter(ref for ref in track_refs if ref)
+        queue = []
+        for ref in self.__queue:
+            if to_remove.get(ref):
+                to_remove[ref] -= 1
+                continue
+            queue.append(ref)
+        self.__queue = queue
 
         self.__update_tracks_positions()
 
@@ -84,4 +80,3 @@ class TracksQueue(GObject.GObject):
 
     def __bool__(self):
         return len(self.__queue) > 0
-
@@ -1,3 +1,4 @@
+import os
 from enum import IntEnum
 
 from gi.repository import GObject
@@ -6,6 +7,9 @@ from beat.components.player import Player, Playback
 from beat.components.queue import TracksQueue
 
 
+# print track switch timings, e.g. BEAT_DEBUG=1 beat
+DEBUG = bool(os.environ.get("BEAT_DEBUG"))
+
 
 class QueueState(IntEnum):
     STOPPED = 0
@@ -27,7 +31,13 @@ class QueueManager(GObject.GObject):
         self.__state = QueueState.STOPPED
         self.__player.connect("notify::state", self.__on_player_state)
         self.__player.connect("eos", self.__on_player_eos)
+        self.__player.connect("track-changed", self.__on_player_track_changed)
+        if DEBUG:
+            self.__player.connect("switch-latency", self.__on_player_switch_latency)
         self.__active_ref = None
+        # every ref offered to the player since the last switch by path, the
+        # player may have taken any of them before the latest preroll
+        self.__preroll_refs = {}
         self.__repeat_mode = None
         self.__shuffle = False
 
@@ -38,6 +48,7 @@ class QueueManager(GObject.GObject):
     @repeat_mode.setter
     def repeat_mode(self, mode):
         self.__repeat_mode = mode
+        self.__preroll()
 
     @property
     def shuffle(self):
@@ -46,6 +57,7 @@ class QueueManager(GObject.GObject):
     @shuffle.setter
     def shuffle(self, shuffle):
         self.__shuffle = shuffle
+        self.__preroll()
 
     def __on_player_eos(self, player):
         if self.__repeat_mode == "song":
@@ -54,6 +66,61 @@ class QueueManager(GObject.GObject):
         else:
             self.play_next()
 
+    def __on_player_switch_latency(self, player, latency):
+        print(f"Track switch took {latency * 1000:.0f} ms")
+
+    def __on_player_track_changed(self, player, track_path):
+        ref = self.__preroll_refs.get(track_path)
+        self.__preroll_refs = {}
+        if not ref or not ref.valid():
+            self.__active_ref = None
+            self.emit("song-changed")
+            self.notify("state")
+            return
+
+        model = ref.store
+        model.set_active_ref(ref)
+        self.__active_ref = ref
+        self.__queue.remove(ref)
+        self.emit("song-changed")
+        self.notify("state")
+        self.__preroll()
+
+    def __get_next_ref(self, auto=False, select=False):
+        if auto and self.__repeat_mode == "song":
+            return self.__active_ref
+
+        if self.__queue:
+            return self.__queue.next
+
+        if not self.__active_ref or not self.__active_ref.valid():
+            return None
+
+        model = self.__active_ref.store
+        if select:
+            ref = model.get_next_and_select(shuffle=self.__shuffle)
+        else:
+            ref = model.peek_next_ref(shuffle=self.__shuffle)
+
+        if not ref and self.__repeat_mode == "playlist":
+            if select:
+                ref = model.get_first_and_select()
+            else:
+                ref = model.get_first_ref()
+
+        return ref
+
+    def __preroll(self):
+        ref = self.__get_next_ref(auto=True)
+        if ref and not ref.valid():
+            ref = None
+        if ref:
+            track_path = ref.store.get_track_path_for_ref(ref)
+            self.__preroll_refs[track_path] = ref
+            self.__player.set_next_track(track_path)
+        else:
+            self.__player.set_next_track(None)
+
     def __on_player_state(self, player, _state):
         player_state = player.props.state
         if player_state == Playback.PLAYING:
@@ -75,9 +142,11 @@ class QueueManager(GObject.GObject):
 
     def add(self, track_refs):
         self.__queue.add(track_refs)
+        self.__preroll()
 
     def remove(self, track_refs):
         self.__queue.remove(track_refs)
+        self.__preroll()
 
     def stop(self):
         self.__player.stop()
@@ -85,9 +154,10 @@ class QueueManager(GObject.GObject):
     def play_ref(self, ref):
         self.__active_ref = ref
         self.emit("song-changed")
-        track = ref.get_model().get_track_path_for_ref(ref)
         self.__queue.remove(ref)
-        self.__player.play(ref.get_model().get_track_path_for_ref(ref))
+        self.__preroll_refs = {}
+        self.__player.play(ref.store.get_track_path_for_ref(ref))
+        self.__preroll()
 
     def pause(self):
         if self.__player.props.state == Playback.PLAYING:
@@ -118,17 +188,10 @@ class QueueManager(GObject.GObject):
         if self.__player.props.state != Playback.PLAYING:
             return
 
-        if self.__active_ref and self.__active_ref.valid():
-            model = self.__active_ref.get_model()
-            ref = model.get_next_and_select(shuffle=self.__shuffle)
-            if ref:
-                self.play_ref(ref)
-                return
-            elif self.__repeat_mode == "playlist":
-                ref = model.get_first_and_select()
-                if ref:
-                    self.play_ref(ref)
-                    return
+        ref = self.__get_next_ref(select=True)
+        if ref:
+            self.play_ref(ref)
+            return
         self.stop()
 
     def play_prev(self):
@@ -136,8 +199,8 @@ class QueueManager(GObject.GObject):
             return
 
         if self.__active_ref and self.__active_ref.valid():
-            model = self.__active_ref.get_model()
-            ref = model.get_prev_and_select()
+            model = self.__active_ref.store
+            ref = model.get_prev_and_select(shuffle=self.__shuffle)
             if ref:
                 self.play_ref(ref)
 
@@ -146,7 +209,7 @@ class QueueManager(GObject.GObject):
         if not self.__active_ref:
             return False
 
-        model = self.__active_ref.get_model()
+        model = self.__active_ref.store
 
         return model.get_next_ref(self.__active_ref) != None
 
@@ -155,7 +218,7 @@ class QueueManager(GObject.GObject):
         if not self.__active_ref:
             return False
 
-        model = self.__active_ref.get_model()
+        model = self.__active_ref.store
 
         return model.get_prev_ref(self.__active_ref) != None
 
@@ -168,6 +231,6 @@ class QueueManager(GObject.GObject):
         if not self.__active_ref:
             return None
 
-        model = self.__active_ref.get_model()
+        model = self.__active_ref.store
         return model.get_track_path_for_ref(self.__active_ref)
 
@@ -0,0 +1,114 @@
+from array import array
+
+
+__all__ = ["RowOrder"]
+
+
+# position of a removed row id
+REMOVED = 0xFFFFFFFF
+
+
+class RowOrder:
+    # Row ids in display order. Ids are handed out sequentially from first_id
+    # and never reused, the position of every id is cached in an array
+    # indexed by id - first_id and rebuilt lazily from the first row that
+    # moved.
+
+    def __init__(self, first_id=1):
+        self.__first_id = first_id
+        self.__ids = array("I")
+        self.__positions = array("I")
+        self.__valid = 0
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __iter__(self):
+        return iter(self.__ids)
+
+    def __contains__(self, row_id):
+        slot = row_id - self.__first_id
+        return 0 <= slot < len(self.__positions) and self.__positions[slot] != REMOVED
+
+    @property
+    def next_id(self):
+        return self.__first_id + len(self.__positions)
+
+    def __invalidate(self, position):
+        self.__valid = min(self.__valid, position)
+
+    def index(self, row_id):
+        if row_id not in self:
+            return -1
+
+        positions = self.__positions
+        ids = self.__ids
+        position = positions[row_id - self.__first_id]
+        if position < len(ids) and ids[position] == row_id:
+            return position
+
+        first_id = self.__first_id
+        for position in range(self.__valid, len(ids)):
+            positions[ids[position] - first_id] = position
+        self.__valid = len(ids)
+        return positions[row_id - first_id]
+
+    def id_at(self, position):
+        if 0 <= position < len(self.__ids):
+            return self.__ids[position]
+
+    def copy(self):
+        return self.__ids[:]
+
+    def slice(self, offset=0, limit=None):
+        end = None if limit is None else offset + limit
+        return self.__ids[offset:end].tolist()
+
+    def insert(self, position):
+        # returns the id of the new row
+        ids = self.__ids
+        row_id = self.next_id
+        if position >= len(ids):
+            if self.__valid == len(ids):
+                self.__valid += 1
+            self.__positions.append(len(ids))
+            ids.append(row_id)
+        else:
+            self.__positions.append(position)
+            ids.insert(position, row_id)
+            self.__invalidate(position)
+        return row_id
+
+    def remove(self, row_id):
+        # returns the position the row had, -1 if it was not there
+        position = self.index(row_id)
+        if position < 0:
+            return position
+
+        del self.__ids[position]
+        self.__positions[row_id - self.__first_id] = REMOVED
+        self.__invalidate(position)
+        return position
+
+    def reorder(self, new_order):
+        # new_order[new position] = old position, like Gtk.ListStore.reorder
+        ids = self.__ids
+        self.__ids = array("I", [ids[i] for i in new_order])
+        self.__invalidate(0)
+
+    def move(self, row_id, position):
+        # returns the new order, or None when the row does not move
+        old_position = self.index(row_id)
+        if old_position < 0:
+            return None
+
+        if old_position < position:
+            position -= 1
+        if position == old_position:
+            return None
+
+        order = list(range(len(self.__ids)))
+        del order[old_position]
+        order.insert(position, old_position)
+        self.reorder(order)
+        return order
@@ -0,0 +1,196 @@
+import re
+from array import array
+
+
+__all__ = ["SearchIndex"]
+
+
+# a gram also gets a bitmap once its posting list has this many rows and
+# takes more room than a bitmap, one bit per row id, would
+DENSE_SIZE = 1024
+DENSE_RATIO = 32
+
+# set bit positions of every byte value
+BYTE_BITS = [tuple(b for b in range(8) if n >> b & 1) for n in range(256)]
+NONZERO = re.compile(rb"[^\x00]")
+
+
+def _grams(text):
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(text[i:i + 3] for i in range(len(text) - 2))
+    return grams
+
+
+def _token_grams(token):
+    if len(token) < 3:
+        return {token}
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _bit_ids(bits):
+    ids = []
+    for match in NONZERO.finditer(bits):
+        i = match.start()
+        base = i << 3
+        ids.extend([base + b for b in BYTE_BITS[bits[i]]])
+    return ids
+
+
+def _and(bitmaps):
+    size = min(len(b) for b in bitmaps)
+    common = -1
+    for bits in bitmaps:
+        common &= int.from_bytes(bits[:size], "little")
+    return common.to_bytes(size, "little")
+
+
+class RowBits:
+    # Query result over common grams, a bitmap indexed by row id.
+
+    __slots__ = ("__bits",)
+
+    def __init__(self, bits):
+        self.__bits = bits
+
+    def __contains__(self, row_id):
+        i = row_id >> 3
+        return i < len(self.__bits) and bool(self.__bits[i] >> (row_id & 7) & 1)
+
+    def __len__(self):
+        return sum(len(BYTE_BITS[b]) for b in self.__bits if b)
+
+    def __iter__(self):
+        return iter(_bit_ids(self.__bits))
+
+
+class SearchIndex:
+    # Bigram and trigram posting lists over row texts. Common grams also get
+    # a bitmap, kept up to date from the tail of their list when queried,
+    # so words made of them are matched with a few big ANDs. Rarer grams are
+    # intersected as sets from the shortest list. Words longer than a
+    # trigram are confirmed with a substring test on the fewest candidates.
+    # Removed rows are cleared from the bitmaps right away and dropped from
+    # the lists lazily, the lists are compacted once dead entries outnumber
+    # live ones.
+
+    def __init__(self):
+        self.__texts = {}
+        self.__postings = {}
+        self.__bitmaps = {}
+        self.__max_id = 0
+        self.__dead = 0
+
+    def __len__(self):
+        return len(self.__texts)
+
+    def add(self, row_id, values):
+        self.__index(row_id, "\n".join(v for v in values if v).casefold())
+
+    def __index(self, row_id, text):
+        self.__texts[row_id] = text
+        self.__max_id = max(self.__max_id, row_id)
+        for gram in _grams(text):
+            postings = self.__postings.get(gram)
+            if postings is None:
+                postings = self.__postings[gram] = array("I")
+            postings.append(row_id)
+
+    def remove(self, row_id):
+        text = self.__texts.pop(row_id, None)
+        if text is None:
+            return
+
+        mask = ~(1 << (row_id & 7))
+        for gram in _grams(text):
+            entry = self.__bitmaps.get(gram)
+            if entry is not None and row_id >> 3 < len(entry[1]):
+                entry[1][row_id >> 3] &= mask
+
+        self.__dead += 1
+        if self.__dead > len(self.__texts):
+            self.__compact()
+
+    def __compact(self):
+        texts = self.__texts
+        self.__texts = {}
+        self.__postings = {}
+        self.__bitmaps = {}
+        self.__dead = 0
+        for row_id, text in texts.items():
+            self.__index(row_id, text)
+
+    def __bitmap(self, gram):
+        postings = self.__postings[gram]
+        entry = self.__bitmaps.get(gram)
+        if entry is None:
+            if len(postings) < DENSE_SIZE or len(postings) * DENSE_RATIO <= self.__max_id:
+                return None
+            entry = self.__bitmaps[gram] = [0, bytearray((self.__max_id >> 3) + 1)]
+
+        count, bits = entry
+        if count < len(postings):
+            tail = postings[count:]
+            if self.__dead:
+                texts = self.__texts
+                tail = [r for r in tail if r in texts]
+            if self.__max_id >> 3 >= len(bits):
+                bits.extend(bytes(max((self.__max_id >> 3) + 1, 2 * len(bits)) - len(bits)))
+            for row_id in tail:
+                bits[row_id >> 3] |= 1 << (row_id & 7)
+            entry[0] = len(postings)
+        return bits
+
+    def build_bitmaps(self):
+        # done with the index build so the first queries don't pay for it
+        for gram in self.__postings:
+            self.__bitmap(gram)
+
+    def query(self, text):
+        # one letter words match nearly everything, they don't filter
+        tokens = [t for t in text.casefold().split() if len(t) > 1]
+        if not tokens:
+            return None
+
+        grams = set()
+        for token in tokens:
+            grams.update(_token_grams(token))
+
+        postings = self.__postings
+        if not all(g in postings for g in grams):
+            return set()
+
+        bitmaps = {}
+        for gram in grams:
+            bits = self.__bitmap(gram)
+            if bits is not None:
+                bitmaps[gram] = bits
+        texts = self.__texts
+
+        # grams of longer words can match apart from each other, those rows
+        # are confirmed with substring tests, which hold for every word
+        if any(len(t) > 3 for t in tokens):
+            candidates = min((postings[g] for g in grams), key=len)
+            if len(bitmaps) == len(grams):
+                common = _and(list(bitmaps.values()))
+                if (len(common) - common.count(0)) * 2 < len(candidates):
+                    candidates = _bit_ids(common)
+
+            get_text = texts.get
+            if len(tokens) == 1:
+                token = tokens[0]
+                return {r for r in candidates if token in get_text(r, "")}
+            return {r for r in candidates if all(t in get_text(r, "") for t in tokens)}
+
+        # words of up to three letters are single grams, matched exactly
+        lists = sorted((postings[g] for g in grams if g not in bitmaps), key=len)
+        if not lists:
+            return RowBits(_and(list(bitmaps.values())))
+
+        candidates = set(lists[0])
+        for items in lists[1:]:
+            candidates.intersection_update(items)
+        for bits in bitmaps.values():
+            candidates = {r for r in candidates if r >> 3 < len(bits) and bits[r >> 3] >> (r & 7) & 1}
+        if self.__dead:
+            candidates.intersection_update(texts.keys())
+        return candidates
@@ -0,0 +1,127 @@
+from collections import deque
+from random import Random
+
+
+__all__ = ["ShuffleOrder"]
+
+
+HISTORY_SIZE = 100
+
+
+class ShuffleOrder:
+    # Lazy Fisher-Yates over row ids. Positions [0, remaining) of the
+    # virtual array hold rows not played in the current cycle, the rest up to
+    # size hold the rows already drawn. Rows are expected at first_id +
+    # position, only positions holding another id are stored, both ways, so
+    # rows can be added, consumed and removed in place without losing the
+    # cycle. Row ids don't change on reorders, the order doesn't either.
+
+    def __init__(self, first_id=1, seed=None):
+        self.__random = Random(seed)
+        self.__first_id = first_id
+        self.__size = 0
+        self.__remaining = 0
+        self.__ids = {}
+        self.__positions = {}
+        self.__pending = None
+        self.__history = deque(maxlen=HISTORY_SIZE)
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def remaining(self):
+        return self.__remaining
+
+    def seed(self, seed):
+        self.__random.seed(seed)
+
+    def __get(self, position):
+        return self.__ids.get(position, self.__first_id + position)
+
+    def __position(self, row_id):
+        return self.__positions.get(row_id, row_id - self.__first_id)
+
+    def __set(self, position, row_id):
+        if row_id == self.__first_id + position:
+            self.__ids.pop(position, None)
+            self.__positions.pop(row_id, None)
+        else:
+            self.__ids[position] = row_id
+            self.__positions[row_id] = position
+
+    def __swap(self, a, b):
+        if a != b:
+            row_a, row_b = self.__get(a), self.__get(b)
+            self.__set(a, row_b)
+            self.__set(b, row_a)
+
+    def add(self, row_ids):
+        # new rows join the unplayed part of the current cycle
+        for row_id in row_ids:
+            position = self.__size
+            self.__size += 1
+            self.__set(position, row_id)
+            self.__swap(position, self.__remaining)
+            self.__remaining += 1
+
+    def remove(self, row_ids):
+        for row_id in row_ids:
+            if self.__pending == row_id:
+                self.__pending = None
+            position = self.__position(row_id)
+            if position < self.__remaining:
+                self.__remaining -= 1
+                self.__swap(position, self.__remaining)
+                position = self.__remaining
+            last = self.__size - 1
+            self.__swap(position, last)
+            self.__ids.pop(last, None)
+            self.__positions.pop(row_id, None)
+            self.__size = last
+
+    def peek(self, exclude=None):
+        if self.__pending is not None:
+            return self.__pending
+
+        if not self.__size:
+            return None
+
+        if not self.__remaining:
+            self.__remaining = self.__size
+
+        position = self.__random.randrange(self.__remaining)
+        row_id = self.__get(position)
+        if row_id == exclude and self.__remaining > 1:
+            position = (position + 1 + self.__random.randrange(self.__remaining - 1)) % self.__remaining
+            row_id = self.__get(position)
+
+        self.__pending = row_id
+        return row_id
+
+    def consume(self, row_id):
+        # marks a row as played in this cycle, whether it was drawn or picked
+        if self.__pending == row_id:
+            self.__pending = None
+
+        position = self.__position(row_id)
+        if position < self.__remaining:
+            self.__remaining -= 1
+            self.__swap(position, self.__remaining)
+
+    def next(self, exclude=None):
+        row_id = self.peek(exclude)
+        if row_id is not None:
+            self.consume(row_id)
+        return row_id
+
+    def push_history(self, item):
+        if self.__history and self.__history[-1] == item:
+            return
+        self.__history.append(item)
+
+    def pop_history(self):
+        if self.__history:
+            self.__history.pop()
+        if self.__history:
+            return self.__history[-1]
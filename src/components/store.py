@@ -1,11 +1,16 @@
-from random import choice
+import locale
+import threading
+from collections import namedtuple
+from itertools import compress
 
 from gettext import gettext as _
-from gi.repository import Gtk
+from gi.repository import Gtk, GLib, GObject
 
-from beat.widgets.cell_renderers import CellRendererActiveTrack
+from beat.widgets.cell_renderers import CellRendererActiveTrack, CellRendererDuration
+from beat.components.shuffle import ShuffleOrder
+from beat.components.search import SearchIndex
 
-__all__ = ["PlayListStore", "PLAYLIST_COLS"]
+__all__ = ["PlayListModel", "PlayListStore", "TrackRef", "PLAYLIST_COLS"]
 
 
 PLAYLIST_COLS = [
@@ -14,8 +19,10 @@ PLAYLIST_COLS = [
     {"key": "artist",   "label": _("Artist"),  "type": str,  "cell_type": Gtk.CellRendererText},
     {"key": "album",    "label": _("Album"),   "type": str,  "cell_type": Gtk.CellRendererText},
     {"key": "title",    "label": _("Title"),   "type": str,  "cell_type": Gtk.CellRendererText},
-    {"key": "length",   "label": _("Length"),  "type": str,  "cell_type": Gtk.CellRendererText},
+    {"key": "length",   "label": _("Length"),  "type": float, "cell_type": CellRendererDuration},
     {"key": "_queue",   "label": "",           "type": str,  "cell_type": Gtk.CellRendererText},
+    {"key": "_id",      "label": "",           "type": int,  "cell_type": None},
+    {"key": "track",    "label": "",           "type": int,  "cell_type": None},
 ]
 
 
@@ -31,23 +38,102 @@ QUEUE_ID = __get_col_id("_queue")
 ARTIST_ID = __get_col_id("artist")
 ALBUM_ID = __get_col_id("album")
 TITLE_ID = __get_col_id("title")
+ROW_ID = __get_col_id("_id")
+TRACK_ID = __get_col_id("track")
+LENGTH_ID = __get_col_id("length")
 
+COL_IDS = {v["key"]: i for i, v in enumerate(PLAYLIST_COLS)}
 
-class PlayListStore(Gtk.ListStore):
-    __gtype_name__ = "PlayListStore"
+# columns kept in the sort key of every row, in this order
+SORT_COLS = (ARTIST_ID, ALBUM_ID, TITLE_ID, TRACK_ID, LENGTH_ID)
+SORT_ORDERS = {
+    "artist": (0, 1, 3, 2),
+    "album":  (1, 3, 2),
+    "title":  (2,),
+    "length": (4,),
+}
 
-    def __init__(self, uuid):
-        super().__init__(*[col["type"] for col in PLAYLIST_COLS])
-        self.__active_ref = None
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    return "" if value is None else str(value)
+
+
+def _to_seconds(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    # playlists saved before the column was numeric keep "m:ss" strings
+    seconds = 0
+    try:
+        for part in (value or "").split(":"):
+            seconds = seconds * 60 + int(part)
+    except ValueError:
+        return 0.0
+    return float(seconds)
+
+
+def _to_int(value):
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    # track numbers may come as "3/12"
+    digits = (value or "").split("/")[0].strip()
+    return int(digits) if digits.isdigit() else 0
+
+
+CONVERTERS = {str: _to_str, float: _to_seconds, int: _to_int}
+
+SEARCH_KEYS = ("artist", "album", "title")
+# columns written to playlist files
+SAVED_KEYS = tuple(c["key"] for c in PLAYLIST_COLS if not c["key"].startswith("_"))
+
+
+def _collate_key(value):
+    return locale.strxfrm(value.casefold()) if value else ""
+
+
+class TrackRef(namedtuple("TrackRef", ("store", "row_id"))):
+    # A playlist row. Unlike Gtk.TreeRowReference it is a plain value,
+    # stores don't have to update it when rows are inserted or moved.
+    __slots__ = ()
+
+    def valid(self):
+        return self.store.has_id(self.row_id)
+
+
+class PlayListModel:
+    # Playlist logic shared by the stores: active track, shuffle and its
+    # history, queue labels and the search index. A store keeps the rows
+    # and provides has_id, get_index_for_id, get_id_at, get_values_for_id,
+    # set_value_for_id, iter_rows and snapshot_rows, and calls _on_rows_added and
+    # _on_rows_removed when it changes.
+
+    def __init__(self, uuid, seed=None, first_id=1):
         self.__uuid = uuid
-        self.__latest_refs = []
+        self.__active_ref = None
+        self.__search = None
+        self.__search_journal = None
+        self.__shuffle = ShuffleOrder(first_id, seed=seed)
 
-    def __get_iter_for_ref(self, ref):
-        if not ref:
-            return None
+    def __get_id_for_ref(self, ref):
+        if ref and ref.store is self and self.has_id(ref.row_id):
+            return ref.row_id
+
+    def __get_value_for_ref(self, ref, key):
+        row_id = self.__get_id_for_ref(ref)
+        if row_id is not None:
+            return self.get_values_for_id(row_id, (key,))[0]
 
-        if ref.valid():
-            return self.get_iter(ref.get_path())
+    def __get_ref_at(self, index):
+        row_id = self.get_id_at(index)
+        if row_id is not None:
+            return TrackRef(self, row_id)
+
+    @property
+    def uuid(self):
+        return self.__uuid
 
     @property
     def active_ref(self):
@@ -56,123 +142,320 @@ class PlayListStore(Gtk.ListStore):
     def set_active_ref(self, ref):
         self.set_state_for_active_ref(None)
         self.__active_ref = ref
-        self.__latest_refs = self.__latest_refs[-4:]
-        self.__latest_refs.append(ref)
+        row_id = self.__get_id_for_ref(ref)
+        if row_id is not None:
+            self.__shuffle.consume(row_id)
+            self.__shuffle.push_history(ref)
 
-    def remove_refs(self, refs):
-        for ref in refs:
-            tree_iter = self.__get_iter_for_ref(ref)
-            if tree_iter:
-                self.remove(tree_iter)
+    def set_state_for_active_ref(self, value):
+        row_id = self.__get_id_for_ref(self.__active_ref)
+        if row_id is not None:
+            self.set_value_for_id(row_id, "_state", value)
 
-    def get_next_ref(self, ref, shuffle=False):
-        if shuffle:
-            exclude_idx = []
-            items = len(self)
-            if items > 5:
-                for i in self.__latest_refs:
-                    if ref.valid():
-                        exclude_idx.append(ref.get_path().get_indices()[0] )
+    def get_state_for_iter(self, tree_iter):
+        return self.get_value(tree_iter, STATE_ID)
 
-            idx = choice([i for i in range(items) if i not in exclude_idx])
-            next_iter = self.get_iter(Gtk.TreePath.new_from_indices([idx]))
+    def get_ref_for_id(self, row_id):
+        if self.has_id(row_id):
+            return TrackRef(self, row_id)
 
-        else:
-            tree_iter = self.__get_iter_for_ref(ref)
-            if not tree_iter:
-                return None
+    def get_index_for_ref(self, ref):
+        row_id = self.__get_id_for_ref(ref)
+        if row_id is not None:
+            return self.get_index_for_id(row_id)
+
+    def get_first_ref(self):
+        return self.__get_ref_at(0)
 
-            next_iter = self.iter_next(tree_iter)
-            if not next_iter:
+    def get_next_ref(self, ref, shuffle=False, peek=False):
+        if shuffle:
+            exclude = self.__get_id_for_ref(ref)
+            if peek:
+                row_id = self.__shuffle.peek(exclude=exclude)
+            else:
+                row_id = self.__shuffle.next(exclude=exclude)
+            if row_id is None:
                 return None
+            return TrackRef(self, row_id)
 
-        return Gtk.TreeRowReference.new(self, self.get_path(next_iter))
+        index = self.get_index_for_ref(ref)
+        if index is None:
+            return None
+        return self.__get_ref_at(index + 1)
 
     def get_prev_ref(self, ref):
-        tree_iter = self.__get_iter_for_ref(ref)
-        if not tree_iter:
+        index = self.get_index_for_ref(ref)
+        if not index:
             return None
+        return self.__get_ref_at(index - 1)
+
+    def get_first_and_select(self) -> str:
+        ref = self.get_first_ref()
+        if ref:
+            self.set_active_ref(ref)
+            return ref
 
-        prev_iter = self.iter_previous(tree_iter)
-        if not prev_iter:
+    def peek_next_ref(self, shuffle=False):
+        return self.get_next_ref(self.__active_ref, shuffle=shuffle, peek=True)
+
+    def get_next_and_select(self, shuffle=False):
+        next_ref = self.get_next_ref(self.__active_ref, shuffle=shuffle)
+        if next_ref:
+            self.set_active_ref(next_ref)
+            return next_ref
+
+    def get_prev_and_select(self, shuffle=False):
+        if shuffle:
+            prev_ref = self.__shuffle.pop_history()
+            while prev_ref and not prev_ref.valid():
+                prev_ref = self.__shuffle.pop_history()
+            if prev_ref:
+                self.set_active_ref(prev_ref)
+                return prev_ref
             return None
 
-        return Gtk.TreeRowReference.new(self, self.get_path(prev_iter))
+        if self.__active_ref:
+            prev_ref = self.get_prev_ref(self.__active_ref)
+            if prev_ref:
+                self.set_active_ref(prev_ref)
+                return prev_ref
 
     def get_position_for_ref(self, ref):
-        tree_iter = self.get_iter(ref.get_path())
-        return self.get_value(tree_iter, QUEUE_ID)
+        return self.__get_value_for_ref(ref, "_queue")
 
     def update_position_for_ref(self, ref, position):
-        tree_iter = self.get_iter(ref.get_path())
-        if position is not None:
-            self.set_value(tree_iter, QUEUE_ID, position)
-        else:
-            self.set_value(tree_iter, QUEUE_ID, None)
+        row_id = self.__get_id_for_ref(ref)
+        if row_id is not None:
+            self.set_value_for_id(row_id, "_queue", position)
+
+    def update_positions(self, rows):
+        for row_id, position in rows.items():
+            if self.has_id(row_id) and self.get_values_for_id(row_id, ("_queue",))[0] != position:
+                self.set_value_for_id(row_id, "_queue", position)
 
     def get_track_path_for_ref(self, ref):
-        tree_iter = self.__get_iter_for_ref(ref)
-        if tree_iter:
-            return self.get_value(tree_iter, SRC_ID)
+        return self.__get_value_for_ref(ref, "src")
 
     def get_artist_for_ref(self, ref):
-        tree_iter = self.__get_iter_for_ref(ref)
-        if tree_iter:
-            return self.get_value(tree_iter, ARTIST_ID)
+        return self.__get_value_for_ref(ref, "artist")
 
     def get_album_for_ref(self, ref):
-        tree_iter = self.__get_iter_for_ref(ref)
-        if tree_iter:
-            return self.get_value(tree_iter, ALBUM_ID)
+        return self.__get_value_for_ref(ref, "album")
 
     def get_title_for_ref(self, ref):
-        tree_iter = self.__get_iter_for_ref(ref)
-        if tree_iter:
-            return self.get_value(tree_iter, TITLE_ID)
+        return self.__get_value_for_ref(ref, "title")
 
     def add_row(self, row: dict, position_iter=None, insert_after=True):
-        row = [row.get(c.get("key")) for c in PLAYLIST_COLS]
-        if position_iter:
-            if insert_after:
-                tree_iter = self.insert_after(position_iter, row)
+        return self.add_rows([row], position_iter=position_iter, insert_after=insert_after, refs=True)[0]
+
+    def _on_rows_added(self, row_ids):
+        if self.__search is not None:
+            for row_id in row_ids:
+                self.__search.add(row_id, self.get_values_for_id(row_id, SEARCH_KEYS))
+        elif self.__search_journal is not None:
+            self.__search_journal.extend((row_id, self.get_values_for_id(row_id, SEARCH_KEYS))
+                                         for row_id in row_ids)
+        self.__shuffle.add(row_ids)
+
+    def _on_rows_removed(self, row_ids):
+        for row_id in row_ids:
+            if self.__search is not None:
+                self.__search.remove(row_id)
+            elif self.__search_journal is not None:
+                self.__search_journal.append((row_id, None))
+        self.__shuffle.remove(row_ids)
+
+    def prepare_search(self):
+        # the index is built once in a thread from a snapshot of the rows,
+        # changes made meanwhile are journaled and replayed when it is ready
+        if self.__search is not None or self.__search_journal is not None:
+            return
+
+        self.__search_journal = []
+        rows = [(row[0], row[1:]) for row in self.iter_rows(("_id",) + SEARCH_KEYS)]
+        thread = threading.Thread(target=self.__build_search, args=(rows,), name="beat-search")
+        thread.daemon = True
+        thread.start()
+
+    def __build_search(self, rows):
+        index = SearchIndex()
+        for row_id, values in rows:
+            index.add(row_id, values)
+        index.build_bitmaps()
+        GLib.idle_add(self.__on_search_built, index)
+
+    def __on_search_built(self, index):
+        for row_id, values in self.__search_journal:
+            if values is None:
+                index.remove(row_id)
             else:
-                tree_iter = self.insert_before(position_iter, row)
-        else:
-            tree_iter = self.append(row)
+                index.add(row_id, values)
+        self.__search_journal = None
+        self.__search = index
+        self.emit("search-ready")
+        return False
+
+    def search(self, text):
+        # None until the index is ready, "search-ready" is emitted then
+        if self.__search is None:
+            self.prepare_search()
+            return None
+        return self.__search.query(text)
 
-        return Gtk.TreeRowReference.new(self, self.get_path(tree_iter))
 
-    def set_state_for_active_ref(self, value):
-        tree_iter = self.__get_iter_for_ref(self.__active_ref)
-        if tree_iter:
-            self.set_value(tree_iter, STATE_ID, value)
+class PlayListStore(PlayListModel, Gtk.ListStore):
+    __gtype_name__ = "PlayListStore"
 
-    def get_state_for_iter(self, tree_iter):
-        return self.get_value(tree_iter, STATE_ID)
+    __gsignals__ = {
+        "search-ready": (GObject.SignalFlags.RUN_FIRST, None, ()),
+    }
+
+    def __init__(self, uuid, seed=None, first_id=1):
+        Gtk.ListStore.__init__(self, *[col["type"] for col in PLAYLIST_COLS])
+        PlayListModel.__init__(self, uuid, seed, first_id)
+        # row ids never change or get reused, ListStore iters persist
+        # across inserts and reorders so they can be indexed directly
+        self.__next_id = first_id
+        self.__iters = {}
+        self.__sort_keys = {}
+        # saved values of every row, so a snapshot doesn't go through GTK
+        self.__saved = {}
+
+    def __new_id(self):
+        row_id = self.__next_id
+        self.__next_id += 1
+        return row_id
 
-    def get_first_and_select(self) -> str:
-        tree_iter = self.get_iter_first()
-        if not tree_iter:
+    @property
+    def next_id(self):
+        return self.__next_id
+
+    def has_id(self, row_id):
+        return row_id in self.__iters
+
+    def get_index_for_id(self, row_id):
+        tree_iter = self.__iters.get(row_id)
+        if tree_iter:
+            return self.get_path(tree_iter).get_indices()[0]
+
+    def get_id_at(self, index):
+        if index < 0:
             return None
-        else:
-            ref = Gtk.TreeRowReference.new(self, self.get_path(tree_iter))
-            if ref:
-                self.set_active_ref(ref)
-                return ref
+        tree_iter = self.iter_nth_child(None, index)
+        if tree_iter:
+            return self.get_value(tree_iter, ROW_ID)
 
-    def get_next_and_select(self, shuffle=False):
-        next_ref = self.get_next_ref(self.__active_ref, shuffle=shuffle)
-        if next_ref:
-            self.set_active_ref(next_ref)
-            return next_ref
+    def get_id_for_iter(self, tree_iter):
+        return self.get_value(tree_iter, ROW_ID)
 
-    def get_prev_and_select(self):
-        if self.__active_ref:
-            prev_ref = self.get_prev_ref(self.__active_ref)
-            if prev_ref:
-                self.set_active_ref(prev_ref)
-                return prev_ref
+    def get_iter_for_id(self, row_id):
+        return self.__iters.get(row_id)
 
-    @property
-    def uuid(self):
-        return uuid
+    def get_ref_for_iter(self, tree_iter):
+        return TrackRef(self, self.get_value(tree_iter, ROW_ID))
+
+    def get_ids(self, offset=0, limit=None):
+        ids = []
+        tree_iter = self.iter_nth_child(None, offset) if offset else self.get_iter_first()
+        while tree_iter and (limit is None or len(ids) < limit):
+            ids.append(self.get_value(tree_iter, ROW_ID))
+            tree_iter = self.iter_next(tree_iter)
+        return ids
+
+    def get_values_for_id(self, row_id, keys):
+        tree_iter = self.__iters.get(row_id)
+        if tree_iter:
+            return [self.get_value(tree_iter, COL_IDS[k]) for k in keys]
+
+    def set_value_for_id(self, row_id, key, value):
+        tree_iter = self.__iters.get(row_id)
+        if tree_iter:
+            self.set_value(tree_iter, COL_IDS[key], value)
+
+    def iter_rows(self, keys):
+        columns = [COL_IDS[k] for k in keys]
+        for row in self:
+            yield [row[c] for c in columns]
+
+    def snapshot_rows(self, keys):
+        # copied now, the rows are built while iterating which is safe to do
+        # from another thread; keys must be in SAVED_KEYS
+        ids = self.get_ids()
+        saved = self.__saved.copy()
+        slots = [SAVED_KEYS.index(k) for k in keys]
+        return ([saved[row_id][s] for s in slots] for row_id in ids)
+
+    def remove_refs(self, refs):
+        removed = []
+        for ref in refs:
+            tree_iter = self.__iters.get(ref.row_id) if ref and ref.store is self else None
+            if tree_iter:
+                self.__iters.pop(ref.row_id)
+                self.__sort_keys.pop(ref.row_id, None)
+                self.__saved.pop(ref.row_id, None)
+                self.remove(tree_iter)
+                removed.append(ref.row_id)
+        self._on_rows_removed(removed)
+
+    def add_rows(self, rows, cols=None, position_iter=None, insert_after=True, refs=False):
+        keys = cols or [c["key"] for c in PLAYLIST_COLS if not c["key"].startswith("_")]
+        columns = [COL_IDS.get(k) for k in keys]
+        if None in columns:
+            mask = [c is not None for c in columns]
+            columns = list(compress(columns, mask))
+        else:
+            mask = None
+
+        converters = [CONVERTERS[PLAYLIST_COLS[c]["type"]] for c in columns]
+        sort_positions = [columns.index(c) if c in columns else None for c in SORT_COLS]
+        saved_positions = [columns.index(COL_IDS[k]) if COL_IDS[k] in columns else None for k in SAVED_KEYS]
+        saved_defaults = [CONVERTERS[PLAYLIST_COLS[COL_IDS[k]]["type"]](None) for k in SAVED_KEYS]
+        saved_slots = list(zip(saved_positions, saved_defaults))
+        columns.append(ROW_ID)
+
+        if position_iter:
+            position = self.get_path(position_iter).get_indices()[0]
+            if insert_after:
+                position += 1
+        else:
+            position = -1
+
+        out = []
+        added = []
+        insert = self.insert_with_valuesv
+        for row in rows:
+            if cols is None:
+                values = [convert(row.get(k)) for convert, k in zip(converters, keys)]
+            elif mask:
+                values = [convert(v) for convert, v in zip(converters, compress(row, mask))]
+            else:
+                values = [convert(v) for convert, v in zip(converters, row)]
+
+            row_id = self.__new_id()
+            self.__sort_keys[row_id] = (
+                *(_collate_key(values[p]) if p is not None else "" for p in sort_positions[:3]),
+                *(values[p] if p is not None else 0 for p in sort_positions[3:]))
+            self.__saved[row_id] = tuple(values[p] if p is not None else d for p, d in saved_slots)
+            values.append(row_id)
+            tree_iter = insert(position, columns, values)
+            self.__iters[row_id] = tree_iter
+            added.append(row_id)
+            if position >= 0:
+                position += 1
+            if refs:
+                out.append(TrackRef(self, row_id))
+
+        self._on_rows_added(added)
+        return out if refs else len(added)
+
+    def sort_by(self, key, descending=False):
+        # sorted once in Python on the cached keys, then applied with a single reorder
+        order = SORT_ORDERS[key]
+        sort_keys = self.__sort_keys
+        rows = []
+        for index, row in enumerate(self):
+            row_key = sort_keys[row[ROW_ID]]
+            rows.append((tuple(row_key[i] for i in order), index))
+        rows.sort(reverse=descending)
+        if rows:
+            self.reorder([index for _key, index in rows])
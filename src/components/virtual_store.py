@@ -0,0 +1,322 @@
+from array import array
+from itertools import compress
+from random import getrandbits
+
+from gi.repository import Gtk, GObject
+
+from beat.components.store import (PlayListModel, TrackRef, PLAYLIST_COLS, COL_IDS, CONVERTERS, SORT_ORDERS,
+                                   STATE_ID, QUEUE_ID, ARTIST_ID, ALBUM_ID, TITLE_ID, ROW_ID, TRACK_ID,
+                                   LENGTH_ID, _collate_key)
+from beat.components.row_order import RowOrder
+
+__all__ = ["VirtualPlayListStore"]
+
+
+COLUMN_GTYPES = {str: GObject.TYPE_STRING, float: GObject.TYPE_DOUBLE, int: GObject.TYPE_INT}
+COLUMN_ARRAYS = {str: "I", float: "d", int: "i"}
+
+# columns only a few rows have a value for
+SPARSE_COLS = (STATE_ID, QUEUE_ID)
+
+
+class VirtualPlayListStore(PlayListModel, GObject.Object, Gtk.TreeModel):
+    # Playlist model for very large playlists. Rows live in typed arrays
+    # indexed by row id with strings interned once per model, GTK only asks
+    # for the values of the rows it draws. Row ids never get reused so the
+    # iters simply carry them and stay valid across inserts and reorders.
+
+    __gtype_name__ = "VirtualPlayListStore"
+
+    __gsignals__ = {
+        "search-ready": (GObject.SignalFlags.RUN_FIRST, None, ()),
+    }
+
+    def __init__(self, uuid, seed=None, first_id=1):
+        GObject.Object.__init__(self)
+        PlayListModel.__init__(self, uuid, seed, first_id)
+        self.__stamp = getrandbits(31)
+        self.__first_id = first_id
+        self.__rows = RowOrder(first_id)
+        self.__strings = []
+        self.__string_index = {}
+        self.__collate_keys = {}
+        self.__sparse = {c: {} for c in SPARSE_COLS}
+        self.__columns = [None if i in SPARSE_COLS or i == ROW_ID else array(COLUMN_ARRAYS[c["type"]])
+                          for i, c in enumerate(PLAYLIST_COLS)]
+
+    def __len__(self):
+        return len(self.__rows)
+
+    # Gtk.TreeModel
+
+    def do_get_flags(self):
+        return Gtk.TreeModelFlags.LIST_ONLY | Gtk.TreeModelFlags.ITERS_PERSIST
+
+    def do_get_n_columns(self):
+        return len(PLAYLIST_COLS)
+
+    def do_get_column_type(self, column):
+        return COLUMN_GTYPES[PLAYLIST_COLS[column]["type"]]
+
+    def __new_iter(self, row_id):
+        tree_iter = Gtk.TreeIter()
+        tree_iter.stamp = self.__stamp
+        tree_iter.user_data = row_id
+        return tree_iter
+
+    def __iter_at(self, position):
+        row_id = self.__rows.id_at(position)
+        if row_id is None:
+            return False, None
+        return True, self.__new_iter(row_id)
+
+    def __move_iter(self, tree_iter, position):
+        row_id = self.__rows.id_at(position)
+        if row_id is None:
+            tree_iter.stamp = 0
+            return False
+        tree_iter.user_data = row_id
+        return True
+
+    def do_get_iter(self, path):
+        indices = path.get_indices()
+        if len(indices) != 1:
+            return False, None
+        return self.__iter_at(indices[0])
+
+    def do_get_path(self, tree_iter):
+        return Gtk.TreePath.new_from_indices([self.__rows.index(tree_iter.user_data)])
+
+    def do_get_value(self, tree_iter, column):
+        return self.__value(tree_iter.user_data, column)
+
+    def do_iter_next(self, tree_iter):
+        return self.__move_iter(tree_iter, self.__rows.index(tree_iter.user_data) + 1)
+
+    def do_iter_previous(self, tree_iter):
+        position = self.__rows.index(tree_iter.user_data)
+        return self.__move_iter(tree_iter, position - 1 if position > 0 else -1)
+
+    def do_iter_children(self, parent):
+        if parent is not None:
+            return False, None
+        return self.__iter_at(0)
+
+    def do_iter_has_child(self, tree_iter):
+        return False
+
+    def do_iter_n_children(self, tree_iter):
+        if tree_iter is not None:
+            return 0
+        return len(self.__rows)
+
+    def do_iter_nth_child(self, parent, n):
+        if parent is not None:
+            return False, None
+        return self.__iter_at(n)
+
+    def do_iter_parent(self, child):
+        return False, None
+
+    # storage
+
+    def __intern(self, value):
+        index = self.__string_index.get(value)
+        if index is None:
+            index = self.__string_index[value] = len(self.__strings)
+            self.__strings.append(value)
+        return index
+
+    def __value(self, row_id, column):
+        if column == ROW_ID:
+            return row_id
+        if column in SPARSE_COLS:
+            return self.__sparse[column].get(row_id)
+
+        value = self.__columns[column][row_id - self.__first_id]
+        if PLAYLIST_COLS[column]["type"] is str:
+            return self.__strings[value]
+        return value
+
+    @property
+    def next_id(self):
+        return self.__rows.next_id
+
+    def has_id(self, row_id):
+        return row_id in self.__rows
+
+    def get_index_for_id(self, row_id):
+        position = self.__rows.index(row_id)
+        if position >= 0:
+            return position
+
+    def get_id_at(self, index):
+        return self.__rows.id_at(index)
+
+    def get_id_for_iter(self, tree_iter):
+        return tree_iter.user_data
+
+    def get_iter_for_id(self, row_id):
+        if row_id in self.__rows:
+            return self.__new_iter(row_id)
+
+    def get_ref_for_iter(self, tree_iter):
+        return TrackRef(self, tree_iter.user_data)
+
+    def get_ids(self, offset=0, limit=None):
+        return self.__rows.slice(offset, limit)
+
+    def get_values_for_id(self, row_id, keys):
+        if row_id in self.__rows:
+            return [self.__value(row_id, COL_IDS[k]) for k in keys]
+
+    def set_value_for_id(self, row_id, key, value):
+        if row_id not in self.__rows:
+            return
+
+        values = self.__sparse[COL_IDS[key]]
+        if value is None:
+            values.pop(row_id, None)
+        else:
+            values[row_id] = value
+        tree_iter = self.__new_iter(row_id)
+        self.row_changed(self.do_get_path(tree_iter), tree_iter)
+
+    def iter_rows(self, keys):
+        columns = [COL_IDS[k] for k in keys]
+        value = self.__value
+        for row_id in self.__rows:
+            yield [value(row_id, c) for c in columns]
+
+    def snapshot_rows(self, keys):
+        # the order and columns are copied now, strings are only ever
+        # appended; the rows are built while iterating, possibly in another
+        # thread. keys must be stored columns, not _state, _queue or _id
+        ids = self.__rows.copy()
+        columns = [(self.__columns[COL_IDS[k]][:], PLAYLIST_COLS[COL_IDS[k]]["type"] is str) for k in keys]
+        strings = self.__strings
+        first_id = self.__first_id
+
+        def rows():
+            for row_id in ids:
+                slot = row_id - first_id
+                yield [strings[values[slot]] if is_str else values[slot] for values, is_str in columns]
+
+        return rows()
+
+    def remove(self, tree_iter):
+        row_id = tree_iter.user_data
+        position = self.__rows.remove(row_id)
+        if position < 0:
+            return False
+
+        for values in self.__sparse.values():
+            values.pop(row_id, None)
+        self.row_deleted(Gtk.TreePath.new_from_indices([position]))
+        return False
+
+    def remove_refs(self, refs):
+        removed = []
+        for ref in refs:
+            if ref and ref.store is self and ref.row_id in self.__rows:
+                self.remove(self.__new_iter(ref.row_id))
+                removed.append(ref.row_id)
+        self._on_rows_removed(removed)
+
+    def reorder(self, new_order):
+        self.__rows.reorder(new_order)
+        self.rows_reordered(Gtk.TreePath(), None, new_order)
+
+    def move_after(self, tree_iter, position_iter):
+        position = self.__rows.index(position_iter.user_data) + 1 if position_iter else 0
+        self.__move(tree_iter, position)
+
+    def move_before(self, tree_iter, position_iter):
+        position = self.__rows.index(position_iter.user_data) if position_iter else len(self.__rows)
+        self.__move(tree_iter, position)
+
+    def __move(self, tree_iter, position):
+        new_order = self.__rows.move(tree_iter.user_data, position)
+        if new_order is not None:
+            self.rows_reordered(Gtk.TreePath(), None, new_order)
+
+    def add_rows(self, rows, cols=None, position_iter=None, insert_after=True, refs=False):
+        keys = cols or [c["key"] for c in PLAYLIST_COLS if not c["key"].startswith("_")]
+        columns = [COL_IDS.get(k) for k in keys]
+        if None in columns:
+            mask = [c is not None for c in columns]
+            columns = list(compress(columns, mask))
+        else:
+            mask = None
+
+        converters = [CONVERTERS[PLAYLIST_COLS[c]["type"]] for c in columns]
+        interned = [PLAYLIST_COLS[c]["type"] is str for c in columns]
+        # columns missing from the rows still need a value for every row id
+        missing = [(self.__columns[i], CONVERTERS[c["type"]](None))
+                   for i, c in enumerate(PLAYLIST_COLS)
+                   if self.__columns[i] is not None and i not in columns]
+        targets = [self.__columns[c] for c in columns]
+
+        if position_iter:
+            position = self.__rows.index(position_iter.user_data)
+            if insert_after:
+                position += 1
+        else:
+            position = len(self.__rows)
+
+        append = position == len(self.__rows)
+        # appending does not move any existing row, nobody needs to hear
+        # about it unless a view or a filter is attached
+        notify = not append or GObject.signal_has_handler_pending(
+            self, GObject.signal_lookup("row-inserted", self.__gtype__), 0, True)
+        intern = self.__intern
+        out = []
+        added = []
+        for row in rows:
+            if cols is None:
+                values = [convert(row.get(k)) for convert, k in zip(converters, keys)]
+            elif mask:
+                values = [convert(v) for convert, v in zip(converters, compress(row, mask))]
+            else:
+                values = [convert(v) for convert, v in zip(converters, row)]
+
+            for target, is_str, value in zip(targets, interned, values):
+                target.append(intern(value) if is_str else value)
+            for target, value in missing:
+                target.append(intern(value) if isinstance(value, str) else value)
+
+            row_id = self.__rows.insert(position)
+            if notify:
+                self.row_inserted(Gtk.TreePath.new_from_indices([position]), self.__new_iter(row_id))
+            if refs:
+                out.append(TrackRef(self, row_id))
+            added.append(row_id)
+            position += 1
+
+        self._on_rows_added(added)
+        return out if refs else len(added)
+
+    def __collate_key(self, index):
+        key = self.__collate_keys.get(index)
+        if key is None:
+            key = self.__collate_keys[index] = _collate_key(self.__strings[index])
+        return key
+
+    def sort_by(self, key, descending=False):
+        # collation keys are computed once per distinct string
+        collate = self.__collate_key
+        artists, albums, titles = (self.__columns[c] for c in (ARTIST_ID, ALBUM_ID, TITLE_ID))
+        fields = (
+            lambda slot: collate(artists[slot]),
+            lambda slot: collate(albums[slot]),
+            lambda slot: collate(titles[slot]),
+            self.__columns[TRACK_ID].__getitem__,
+            self.__columns[LENGTH_ID].__getitem__,
+        )
+        getters = [fields[i] for i in SORT_ORDERS[key]]
+        first_id = self.__first_id
+        rows = [(tuple(get(row_id - first_id) for get in getters), index)
+                for index, row_id in enumerate(self.__rows)]
+        rows.sort(reverse=descending)
+        if rows:
+            self.reorder([index for _key, index in rows])
@@ -1,17 +1,33 @@
 import configparser
 import csv
+import io
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from uuid import uuid4
 
 from gi.repository import GObject, GLib
 
+from beat.utils.playlist_file import PlaylistReader, write_playlist, PLAYLIST_SUFFIX
+
 
 __all__= ["Settings"]
 
 
 uuid_regexp = re.compile('^[a-f0-9]{8}-?[a-f0-9]{4}-?4[a-f0-9]{3}-?[89ab][a-f0-9]{3}-?[a-f0-9]{12}\Z', re.I)
 
+SAVE_DELAY = 1000
+
+
+def _write_atomic(path, write, binary=False):
+    tmp_path = path.with_name(path.name + ".tmp")
+    with (tmp_path.open('wb') if binary else tmp_path.open('w')) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 
 class BeatConfig(configparser.ConfigParser):
     def __init__(self, *args, **kwargs):
@@ -36,12 +52,17 @@ class Settings:
         self.__config_dir = Path(GLib.get_user_config_dir(), "beat")
         self.__config_file = Path(self.__config_dir, "config.ini")
         self.__config = BeatConfig()
+        self.__config_dirty = False
+        self.__dirty_playlists = {}
+        self.__save_source_id = None
+        self.__writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="beat-settings")
         self.__init_dirs()
         self.__load()
         self.__app.props.win.connect("playlist-changed", self.__on_playlist_changed)
         self.__app.props.win.connect("tab-selected", self.__on_playlist_switch)
         self.__app.props.win.connect("tab-renamed", self.__on_playlist_renamed)
         self.__app.props.win.connect("tab-removed", self.__on_playlist_removed)
+        self.__app.connect("shutdown", self.__on_shutdown)
 
     def __init_dirs(self):
         if not self.__config_dir.exists():
@@ -52,17 +73,82 @@ class Settings:
 
         for p in self.__get_playlists():
             self.__app.props.win.create_playlist_tab(label=p.get("label"),
-                                                     rows=p.get("rows"),
                                                      uuid=p.get("uuid"),
                                                      selected=p.get("selected"),
-                                                     saved=True)
+                                                     saved=True,
+                                                     loader=p.get("loader"))
 
     def __save(self):
-        with self.__config_file.open('w') as f:
-            self.__config.write(f)
+        self.__config_dirty = True
+        self.__schedule_save()
+
+    def __schedule_save(self):
+        if self.__save_source_id is None:
+            self.__save_source_id = GLib.timeout_add(SAVE_DELAY, self.__on_save_timeout)
+
+    def __on_save_timeout(self):
+        self.__save_source_id = None
+        self.__flush()
+        return False
+
+    def __flush(self):
+        playlists, self.__dirty_playlists = self.__dirty_playlists, {}
+        converted = []
+        for playlist in playlists.values():
+            filename = self.__config.get_value(playlist.uuid, "file")
+            if not filename:
+                continue
+
+            path = Path(self.__config_dir, filename)
+            if not filename.endswith(PLAYLIST_SUFFIX):
+                old_path = path
+                filename = f"{playlist.uuid}{PLAYLIST_SUFFIX}"
+                path = Path(self.__config_dir, filename)
+                converted.append((path, old_path))
+                self.__config.set_value(playlist.uuid, "file", filename)
+                self.__config_dirty = True
+
+            cols = playlist.get_cols()
+            # the rows are serialized on the writer thread
+            self.__writer.submit(self.__write_playlist, path, playlist.label, cols, playlist.get_rows())
+
+        if self.__config_dirty:
+            self.__config_dirty = False
+            buffer = io.StringIO()
+            self.__config.write(buffer)
+            self.__writer.submit(self.__write_config, buffer.getvalue(), converted)
+
+    def __write_config(self, data, converted=()):
+        try:
+            _write_atomic(self.__config_file, lambda f: f.write(data))
+        except OSError as e:
+            print(f"Unable to save config: {e}")
+            return
+
+        # legacy files go only once the config points at their replacement
+        for path, old_path in converted:
+            if path.exists() and old_path != path:
+                old_path.unlink(True)
 
         print("Config saved")
 
+    @staticmethod
+    def __write_playlist(path, label, cols, rows):
+        try:
+            _write_atomic(path, lambda f: write_playlist(f, cols, rows), binary=True)
+        except OSError as e:
+            print(f"Unable to save playlist {label}: {e}")
+            return
+
+        print(f"Playlist {label} saved")
+
+    def __on_shutdown(self, _app):
+        if self.__save_source_id is not None:
+            GLib.source_remove(self.__save_source_id)
+            self.__save_source_id = None
+        self.__flush()
+        self.__writer.shutdown(wait=True)
+
     def __get_playlist_keys(self):
         return [k for k in self.__config if uuid_regexp.match(k)]
 
@@ -85,15 +171,9 @@ class Settings:
                 need_save = True
                 continue
 
-            rows = []
-            with playlist_file.open() as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    rows.append(row)
-
             out.append({
                 "label": self.__config[p].get('label'),
-                "rows": rows,
+                "loader": self.__get_playlist_loader(playlist_file),
                 "uuid": p,
                 "position": self.__config[p].get('position'),
                 "selected": selected_uuid and selected_uuid == p
@@ -106,6 +186,31 @@ class Settings:
 
         return out
 
+    def __get_playlist_loader(self, playlist_file):
+        def load(playlist):
+            if not playlist_file.exists():
+                return
+
+            if playlist_file.suffix == PLAYLIST_SUFFIX:
+                try:
+                    with PlaylistReader(playlist_file) as reader:
+                        playlist.add_rows(reader, reader.cols)
+                except ValueError as e:
+                    print(f"Unable to load playlist {playlist.label}: {e}")
+                return
+
+            with playlist_file.open() as f:
+                reader = csv.reader(f)
+                cols = next(reader, None)
+                if cols:
+                    playlist.add_rows(reader, cols)
+
+            # convert legacy csv playlists on the next save
+            self.__dirty_playlists[playlist.uuid] = playlist
+            self.__schedule_save()
+
+        return load
+
     def __on_playlist_changed(self, _win, playlist):
         uuid = playlist.uuid
         if uuid is None:
@@ -113,22 +218,13 @@ class Settings:
 
         filename = self.__config.get_value(uuid, "file")
         if not filename:
-            filename = f"{uuid}.csv"
+            filename = f"{uuid}{PLAYLIST_SUFFIX}"
             self.__config.set_value(uuid, "file", filename)
         self.__config.set_value(uuid, "label", playlist.label)
         self.__config.set_value(uuid, "position", playlist.index)
+        self.__dirty_playlists[uuid] = playlist
         self.__save()
 
-        cols = playlist.get_cols()
-
-        with Path(self.__config_dir, filename).open('w') as f:
-            writer = csv.writer(f, quoting=csv.QUOTE_NONNUMERIC)
-            writer.writerow(cols)
-            for row in playlist.get_rows():
-                writer.writerow(row)
-
-            print(f"Playlist {playlist.label} saved")
-
     def __on_playlist_switch(self, _win, uuid):
         self.__config.set_value("main", "selected", uuid)
         self.__save()
@@ -141,9 +237,10 @@ class Settings:
         if not uuid in self.__config:
             return
 
+        self.__dirty_playlists.pop(uuid, None)
         filename = self.__config.get_value(uuid, 'file')
         if filename:
-            Path(self.__config_dir, filename).unlink(True)
+            self.__writer.submit(Path(self.__config_dir, filename).unlink, True)
 
         self.__config.remove_section(uuid)
         self.__save()
@@ -1,57 +1,142 @@
-import re
-import shutil
-from hashlib import md5
+import os
+import threading
+from hashlib import sha1
 from pathlib import Path
 
 from gi.repository import GLib
 
 from beat.tinytag import TinyTag
+from beat.utils.tag_cache import TagCache
 
 
 __all__ = ["ArtInfo"]
 
 
-class ArtInfo:
-    def __init__(self, url):
-        self.__url = url
-        self.__md5 = md5(url.encode()).hexdigest()
-        self.__tag = TinyTag.get(url, image=True)
-        keywords = ["album", "cover"]
-        if self.__tag.album:
-            keywords.append(self.__tag.album.lower())
-        if self.__tag.artist:
-            keywords.append(self.__tag.artist.lower())
+COVER_KEYWORDS = ("album", "cover")
+COVER_EXTENSIONS = (".jpg", ".jpeg", ".png")
 
-        self.__cover_pattern = re.compile(".*(" + "|".join(keywords) + ").*\.(jpg|jpeg|png)")
+CACHE_MAX_SIZE = 256 * 1024 * 1024
+TRIM_EVERY = 32
 
-        self.__cache_dir = Path(GLib.get_user_cache_dir(), "beat", "art")
+_trim_lock = threading.Lock()
+_writes_since_trim = TRIM_EVERY
 
-        if not self.__cache_dir.exists():
-            self.__cache_dir.mkdir(parents=True)
 
-    def get_image_path(self):
-        path = Path(self.__cache_dir, self.__md5)
-        if path.exists():
-            return str(path)
+def find_cover(directory, keywords):
+    try:
+        files = sorted(f for f in Path(directory).iterdir() if f.is_file())
+    except OSError:
+        return None
+
+    for f in files:
+        name = f.name.lower()
+        if name.endswith(COVER_EXTENSIONS) and any(k in name for k in keywords):
+            return f
 
-        image_data = self.__tag.get_image()
-        if image_data:
-            with path.open(mode='wb') as f:
-                f.write(image_data)
 
-            return str(path)
+def trim_cache(cache_dir, max_size=CACHE_MAX_SIZE):
+    # drop the least recently used images until the cache fits in max_size
+    entries = []
+    total = 0
+    for f in Path(cache_dir, "art").iterdir():
+        try:
+            stat = f.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, f))
+        total += stat.st_size
 
-        else:
-            filepath = None
-            for f in Path(self.__url).parent.iterdir():
-                if f.is_dir():
-                    continue
+    if total <= max_size:
+        return []
 
-                if self.__cover_pattern.match(f.name.lower()):
-                    filepath = f
-                    break
+    removed = []
+    entries.sort()
+    for _mtime, size, f in entries:
+        if total <= max_size:
+            break
+        f.unlink(True)
+        for thumb in Path(cache_dir, "thumbs").glob(f"*/{f.name}.png"):
+            thumb.unlink(True)
+        total -= size
+        removed.append(f.name)
 
-            if filepath:
-                shutil.copyfile(filepath, str(path))
-                return str(path)
+    return removed
 
+
+class ArtInfo:
+    def __init__(self, url):
+        self.__url = url
+        self.__cache = TagCache.get_default()
+        self.__cache_root = Path(GLib.get_user_cache_dir(), "beat")
+        self.__cache_dir = Path(self.__cache_root, "art")
+        self.__cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def __get_cached(self, name):
+        if not name:
+            return None
+        path = Path(self.__cache_dir, name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return str(path)
+
+    def __save(self, data):
+        name = sha1(data).hexdigest()
+        path = Path(self.__cache_dir, name)
+        if self.__get_cached(name):
+            return name
+
+        tmp_path = path.with_name(name + ".tmp")
+        with tmp_path.open(mode='wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.__trim()
+        return name
+
+    def __trim(self):
+        global _writes_since_trim
+        with _trim_lock:
+            _writes_since_trim += 1
+            if _writes_since_trim < TRIM_EVERY:
+                return
+            _writes_since_trim = 0
+            removed = trim_cache(self.__cache_root)
+        if removed:
+            self.__cache.forget_art(removed)
+
+    def get_image_path(self, scan_dir=True):
+        stat = os.stat(self.__url)
+        name = self.__cache.lookup_art(self.__url, stat)
+        if name == "":
+            return None
+
+        path = self.__get_cached(name)
+        if path:
+            return path
+
+        tag = TinyTag.get(self.__url, image=True)
+        image_data = tag.get_image()
+        name = None
+        if image_data:
+            name = self.__save(image_data)
+
+        elif scan_dir:
+            directory = Path(self.__url).parent
+            name = self.__cache.lookup_dir_art(directory, tag.album, tag.artist)
+            # "" means the directory was already scanned and has no cover
+            if name != "" and not self.__get_cached(name):
+                keywords = list(COVER_KEYWORDS)
+                if tag.album:
+                    keywords.append(tag.album.lower())
+                if tag.artist:
+                    keywords.append(tag.artist.lower())
+
+                filepath = find_cover(directory, keywords)
+                name = self.__save(filepath.read_bytes()) if filepath else ""
+                self.__cache.store_dir_art(directory, tag.album, tag.artist, name)
+
+        if name is not None:
+            self.__cache.store_art(self.__url, stat, name)
+
+        return self.__get_cached(name)
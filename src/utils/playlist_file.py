@@ -0,0 +1,199 @@
+import mmap
+import struct
+import sys
+from array import array
+
+
+__all__ = ["PlaylistReader", "write_playlist", "PLAYLIST_SUFFIX"]
+
+
+# Layout, all integers little endian:
+#
+#   header          MAGIC, rows, cols, strings
+#   column names    cols * uint32 string index
+#   column types    cols * byte, "s" (uint32 string index) or "d" (float64)
+#   string offsets  (strings + 1) * uint32 offset into the string blob
+#   columns         one array of rows items per column
+#   string blob     utf-8 strings, each one stored once
+
+PLAYLIST_SUFFIX = ".bpl"
+
+MAGIC = b"BEATPL\x00\x01"
+HEADER = struct.Struct("<8sIII")
+
+STRING_COL = ord("s")
+NUMBER_COL = ord("d")
+
+
+def _to_le(values):
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def _pad(f, size):
+    remainder = f.tell() % size
+    if remainder:
+        f.write(b"\x00" * (size - remainder))
+
+
+def write_playlist(f, cols, rows):
+    strings = {}
+    blob = []
+
+    def intern(value):
+        idx = strings.get(value)
+        if idx is None:
+            idx = strings[value] = len(blob)
+            blob.append(value.encode())
+        return idx
+
+    rows = list(rows)
+    types = []
+    data = []
+    for col_idx, col in enumerate(cols):
+        values = [r[col_idx] for r in rows]
+        is_number = bool(values) and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)
+        if is_number:
+            types.append(NUMBER_COL)
+            data.append(array("d", values))
+        else:
+            types.append(STRING_COL)
+            data.append(array("I", [intern("" if v is None else str(v)) for v in values]))
+
+    names = array("I", [intern(c) for c in cols])
+
+    offsets = array("I", [0])
+    for b in blob:
+        offsets.append(offsets[-1] + len(b))
+
+    f.write(HEADER.pack(MAGIC, len(rows), len(cols), len(blob)))
+    f.write(_to_le(names).tobytes())
+    f.write(bytes(types))
+    _pad(f, 4)
+    f.write(_to_le(offsets).tobytes())
+    for values in data:
+        _pad(f, values.itemsize)
+        f.write(_to_le(values).tobytes())
+    f.write(b"".join(blob))
+
+
+class PlaylistReader:
+    def __init__(self, path):
+        self.__views = []
+        self.__columns = []
+        self.__offsets = None
+        self.__mm = None
+        self.__file = open(path, "rb")
+        try:
+            self.__mm = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__parse()
+        except (ValueError, TypeError, struct.error) as e:
+            self.close()
+            raise ValueError(f"{path} is not a valid beat playlist: {e}") from e
+
+    def __need(self, pos, size):
+        if pos + size > len(self.__mm):
+            raise ValueError("file is truncated")
+
+    def __parse(self):
+        self.__need(0, HEADER.size)
+        magic, self.__rows, n_cols, n_strings = HEADER.unpack_from(self.__mm, 0)
+        if magic != MAGIC:
+            raise ValueError("wrong magic")
+
+        view = memoryview(self.__mm)
+        self.__views.append(view)
+        pos = HEADER.size
+
+        self.__need(pos, n_cols * 5)
+        names = list(self.__array(view, pos, n_cols, "I"))
+        pos += n_cols * 4
+        types = self.__mm[pos:pos + n_cols]
+        pos += n_cols
+        pos += -pos % 4
+
+        self.__need(pos, (n_strings + 1) * 4)
+        self.__offsets = self.__array(view, pos, n_strings + 1, "I")
+        pos += (n_strings + 1) * 4
+
+        for t in types:
+            if t == NUMBER_COL:
+                pos += -pos % 8
+                self.__need(pos, self.__rows * 8)
+                self.__columns.append((NUMBER_COL, self.__array(view, pos, self.__rows, "d")))
+                pos += self.__rows * 8
+            elif t == STRING_COL:
+                pos += -pos % 4
+                self.__need(pos, self.__rows * 4)
+                self.__columns.append((STRING_COL, self.__array(view, pos, self.__rows, "I")))
+                pos += self.__rows * 4
+            else:
+                raise ValueError(f"unknown column type {t}")
+
+        self.__blob = pos
+        offsets = self.__offsets
+        if any(offsets[i] > offsets[i + 1] for i in range(n_strings)):
+            raise ValueError("string offsets are not ordered")
+        self.__need(pos, offsets[n_strings])
+        for kind, values in self.__columns:
+            if kind == STRING_COL and values and max(values) >= n_strings:
+                raise ValueError("string index out of range")
+        if names and max(names) >= n_strings:
+            raise ValueError("string index out of range")
+
+        self.__strings = [None] * n_strings
+        self.__cols = [self.__string(i) for i in names]
+
+    def __array(self, view, pos, count, typecode):
+        size = array(typecode).itemsize
+        if sys.byteorder == "little":
+            chunk = view[pos:pos + count * size]
+            values = chunk.cast(typecode)
+            self.__views.extend((chunk, values))
+            return values
+        values = array(typecode, self.__mm[pos:pos + count * size])
+        values.byteswap()
+        return values
+
+    def __string(self, idx):
+        value = self.__strings[idx]
+        if value is None:
+            start = self.__blob + self.__offsets[idx]
+            end = self.__blob + self.__offsets[idx + 1]
+            value = self.__strings[idx] = self.__mm[start:end].decode()
+        return value
+
+    @property
+    def cols(self):
+        return self.__cols
+
+    def __len__(self):
+        return self.__rows
+
+    def __iter__(self):
+        iterators = []
+        for kind, values in self.__columns:
+            if kind == NUMBER_COL:
+                iterators.append(iter(values))
+            else:
+                iterators.append(map(self.__string, values))
+        return zip(*iterators)
+
+    def close(self):
+        self.__columns = []
+        self.__offsets = None
+        for view in reversed(self.__views):
+            view.release()
+        self.__views = []
+        if self.__mm is not None:
+            self.__mm.close()
+            self.__mm = None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
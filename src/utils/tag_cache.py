@@ -0,0 +1,184 @@
+import atexit
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from gi.repository import GLib
+
+
+__all__ = ["TagCache", "TAG_FIELDS"]
+
+
+SCHEMA_VERSION = 3
+FLUSH_SIZE = 256
+
+TAG_FIELDS = ("artist", "album", "title", "track", "duration", "bitrate", "samplerate", "channels")
+
+
+class TagCache:
+    __default = None
+    __default_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.__path = Path(path) if path else Path(GLib.get_user_cache_dir(), "beat", "tags.sqlite")
+        if not self.__path.parent.exists():
+            self.__path.parent.mkdir(parents=True)
+
+        self.__local = threading.local()
+        self.__lock = threading.Lock()
+        self.__pending = []
+        self.__init_schema()
+        atexit.register(self.flush)
+
+    @classmethod
+    def get_default(cls):
+        with cls.__default_lock:
+            if cls.__default is None:
+                cls.__default = cls()
+            return cls.__default
+
+    def __connection(self):
+        conn = getattr(self.__local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.__path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.__local.conn = conn
+        return conn
+
+    def __init_schema(self):
+        conn = self.__connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS tags")
+            conn.execute("DROP TABLE IF EXISTS art")
+            conn.execute("DROP TABLE IF EXISTS dir_art")
+            conn.execute("DROP TABLE IF EXISTS library_roots")
+            conn.execute("DROP TABLE IF EXISTS library")
+            conn.execute("CREATE TABLE tags (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, "
+                         + ", ".join(TAG_FIELDS) + ")")
+            conn.execute("CREATE TABLE art (path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, image TEXT)")
+            conn.execute("CREATE TABLE dir_art (dir TEXT, album TEXT, artist TEXT, image TEXT, "
+                         "PRIMARY KEY (dir, album, artist))")
+            conn.execute("CREATE TABLE library_roots (path TEXT PRIMARY KEY)")
+            conn.execute("CREATE TABLE library (path TEXT PRIMARY KEY, root TEXT, mtime INTEGER, size INTEGER)")
+            conn.execute("CREATE INDEX library_root ON library (root)")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def lookup(self, path, stat=None):
+        path = str(path)
+        if stat is None:
+            stat = os.stat(path)
+
+        row = self.__connection().execute(
+            "SELECT " + ", ".join(TAG_FIELDS) + " FROM tags WHERE path = ? AND mtime = ? AND size = ?",
+            (path, stat.st_mtime_ns, stat.st_size)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(zip(TAG_FIELDS, row))
+
+    def store(self, path, stat, tags):
+        values = (str(path), stat.st_mtime_ns, stat.st_size) + tuple(tags.get(f) for f in TAG_FIELDS)
+        with self.__lock:
+            self.__pending.append(values)
+            if len(self.__pending) >= FLUSH_SIZE:
+                self.__flush_pending()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush_pending()
+
+    def __flush_pending(self):
+        if not self.__pending:
+            return
+
+        pending, self.__pending = self.__pending, []
+        placeholders = ", ".join("?" * (len(TAG_FIELDS) + 3))
+        try:
+            with self.__connection() as conn:
+                conn.executemany(f"INSERT OR REPLACE INTO tags VALUES ({placeholders})", pending)
+        except sqlite3.Error as e:
+            print(f"Unable to write tag cache: {e}")
+
+    def lookup_art(self, path, stat):
+        row = self.__connection().execute(
+            "SELECT image FROM art WHERE path = ? AND mtime = ? AND size = ?",
+            (str(path), stat.st_mtime_ns, stat.st_size)).fetchone()
+        return row[0] if row else None
+
+    def store_art(self, path, stat, image):
+        self.__write("INSERT OR REPLACE INTO art VALUES (?, ?, ?, ?)",
+                     (str(path), stat.st_mtime_ns, stat.st_size, image))
+
+    def lookup_dir_art(self, directory, album, artist):
+        row = self.__connection().execute(
+            "SELECT image FROM dir_art WHERE dir = ? AND album = ? AND artist = ?",
+            (str(directory), album or "", artist or "")).fetchone()
+        return row[0] if row else None
+
+    def store_dir_art(self, directory, album, artist, image):
+        self.__write("INSERT OR REPLACE INTO dir_art VALUES (?, ?, ?, ?)",
+                     (str(directory), album or "", artist or "", image))
+
+    def forget_art(self, images):
+        images = [(i,) for i in images]
+        self.__write_many("DELETE FROM art WHERE image = ?", images)
+        self.__write_many("DELETE FROM dir_art WHERE image = ?", images)
+
+    def __write(self, query, values):
+        self.__write_many(query, [values])
+
+    def __write_many(self, query, values):
+        with self.__lock:
+            try:
+                with self.__connection() as conn:
+                    conn.executemany(query, values)
+            except sqlite3.Error as e:
+                print(f"Unable to write tag cache: {e}")
+
+    def get_library_roots(self):
+        return [r[0] for r in self.__connection().execute("SELECT path FROM library_roots")]
+
+    def add_library_root(self, path):
+        self.__write("INSERT OR IGNORE INTO library_roots VALUES (?)", (str(path),))
+
+    def remove_library_root(self, path):
+        self.__write("DELETE FROM library_roots WHERE path = ?", (str(path),))
+        self.__write("DELETE FROM library WHERE root = ?", (str(path),))
+
+    def get_library_stats(self, root):
+        rows = self.__connection().execute(
+            "SELECT path, mtime, size FROM library WHERE root = ?", (str(root),))
+        return {path: (mtime, size) for path, mtime, size in rows}
+
+    def store_library_tracks(self, root, tracks):
+        # tracks is a list of (path, stat)
+        self.__write_many("INSERT OR REPLACE INTO library VALUES (?, ?, ?, ?)",
+                          [(str(path), str(root), stat.st_mtime_ns, stat.st_size) for path, stat in tracks])
+
+    def remove_library_tracks(self, paths):
+        self.__write_many("DELETE FROM library WHERE path = ?", [(str(p),) for p in paths])
+
+    def remove_library_prefix(self, directory):
+        prefix = str(directory).rstrip(os.sep) + os.sep
+        self.__write("DELETE FROM library WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+
+    def get_library_tags(self, directory):
+        # tags of every library track under directory, ordered by path
+        self.flush()
+        prefix = str(directory).rstrip(os.sep) + os.sep
+        rows = self.__connection().execute(
+            "SELECT library.path, " + ", ".join("tags." + f for f in TAG_FIELDS)
+            + " FROM library JOIN tags ON tags.path = library.path"
+            " AND tags.mtime = library.mtime AND tags.size = library.size"
+            " WHERE substr(library.path, 1, ?) = ? ORDER BY library.path",
+            (len(prefix), prefix))
+        for row in rows:
+            yield row[0], dict(zip(TAG_FIELDS, row[1:]))
+
@@ -1,9 +1,8 @@
-import re
-from hashlib import md5
-from pathlib import Path
+import os
 from gettext import gettext as _
 
 from beat.tinytag import TinyTag
+from beat.utils.tag_cache import TagCache, TAG_FIELDS
 
 
 
@@ -12,40 +11,67 @@ __all__ = ["TrackInfo"]
 
 class TrackInfo:
     def __init__(self, url):
-        self.__url = url
-        self.__tag = TinyTag.get(url, image=False)
+        self.__url = str(url)
+        cache = TagCache.get_default()
+        stat = os.stat(self.__url)
+        self.__tag = cache.lookup(self.__url, stat)
+        if self.__tag is None:
+            tag = TinyTag.get(self.__url, image=False)
+            self.__tag = {f: getattr(tag, f, None) for f in TAG_FIELDS}
+            cache.store(self.__url, stat, self.__tag)
+
+    @classmethod
+    def from_tags(cls, url, tags):
+        info = cls.__new__(cls)
+        info.__url = str(url)
+        info.__tag = tags
+        return info
+
+    def to_row(self):
+        return {"src":    self.__url,
+                "artist": self.artist,
+                "album":  self.album,
+                "title":  self.title,
+                "length": self.duration or 0.0,
+                "track":  self.track}
 
     def is_valid(self):
         return self.__tag is not None
 
     @property
     def album(self):
-        value = self.__tag.album
+        value = self.__tag["album"]
         if not value:
             return _("unknown album")
         return value
 
     @property
     def artist(self):
-        value = self.__tag.artist
+        value = self.__tag["artist"]
         if not value:
             return _("unknown artist")
         return value
 
     @property
     def title(self):
-        value = self.__tag.title
+        value = self.__tag["title"]
         if not value:
             return _("unknown")
         return value
 
+    @property
+    def track(self):
+        # "3/12" is common in id3 tags
+        value = str(self.__tag.get("track") or "").split("/")[0].strip()
+        return int(value) if value.isdigit() else 0
+
     @property
     def duration(self):
-        return self.__tag.duration
+        return self.__tag["duration"]
 
     @property
     def duration_str(self):
-        return self.get_time_str(self.__tag.duration)
+        return self.get_time_str(self.__tag["duration"])
 
     @staticmethod
     def get_time_str(seconds) -> str:
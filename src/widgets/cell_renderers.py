@@ -1,4 +1,6 @@
-from gi.repository import Gtk, GdkPixbuf
+from gi.repository import Gtk, GdkPixbuf, GObject
+
+from beat.utils.track_info import TrackInfo
 
 
 __all__ = ['CellRendererActiveTrack', 'CellRendererDuration']
@@ -23,9 +25,19 @@ class CellRendererActiveTrack(Gtk.CellRendererPixbuf):
             self.set_property("pixbuf", None)
 
 
-# TODO: convert seconds to text
 class CellRendererDuration(Gtk.CellRendererText):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.__duration = 0.0
+        self.set_property("xalign", 1.0)
+
+    @GObject.Property(type=float)
+    def duration(self):
+        return self.__duration
+
+    @duration.setter
+    def duration(self, value):
+        self.__duration = value
+        self.set_property("text", TrackInfo.get_time_str(value) if value > 0 else "")
 
     
@@ -1,11 +1,7 @@
-import io
-import threading
-
-
+from gettext import gettext as _
 from gi.repository import Gtk, GdkPixbuf, GLib
 
 from beat.components.player import Playback
-from beat.utils.art_info import ArtInfo
 from beat.widgets.spectrum import Spectrum
 
 
@@ -20,24 +16,49 @@ class StatusBar(Gtk.Box):
     def __init__(self, app):
         super().__init__()
         self.__app = app
-        self.__app.queue.props.player.connect("notify::state", self.__on_player_state)
+        player = self.__app.queue.props.player
+        player.connect("notify::state", self.__on_player_state)
+        # a gapless switch stays in PLAYING
+        player.connect("track-changed", self.__on_player_track_changed)
         self.__cover_image = Gtk.Image()
         self.__cover_image.props.pixbuf = self.__generic_cover
         self.pack_start(self.__cover_image, False, False, 0)
         self.__track_path = None
 
+        # import progress
+        self.__importers = []
+        self.__import_box = Gtk.Box(spacing=5)
+        self.__import_progress = Gtk.ProgressBar()
+        self.__import_progress.set_show_text(True)
+        self.__import_progress.props.valign = Gtk.Align.CENTER
+        import_cancel = Gtk.Button.new_from_icon_name("process-stop-symbolic", Gtk.IconSize.BUTTON)
+        import_cancel.set_relief(Gtk.ReliefStyle.NONE)
+        import_cancel.set_tooltip_text(_("Cancel import"))
+        import_cancel.connect("clicked", self.__on_import_cancel)
+        self.__import_box.pack_start(self.__import_progress, False, False, 0)
+        self.__import_box.pack_start(import_cancel, False, False, 0)
+        self.__import_progress.show()
+        import_cancel.show()
+        self.__import_box.set_no_show_all(True)
+        self.pack_start(self.__import_box, False, False, 0)
+
         # spectrum
         self.__spectrum = Spectrum(self.__app)
         self.pack_end(self.__spectrum, True, True, 0)
         self.show_all()
 
-    def __update_cover(self):
-        image_path = ArtInfo(self.__track_path).get_image_path()
+    def __on_cover_ready(self, track_path, image_path):
+        if track_path != self.__track_path:
+            return
+
         if not image_path:
             self.__cover_image.props.pixbuf = self.__generic_cover
             return
 
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(image_path, 32, 32, True)
+        try:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_scale(image_path, 32, 32, True)
+        except GLib.Error:
+            pixbuf = self.__generic_cover
 
         self.__cover_image.props.pixbuf = pixbuf
 
@@ -45,13 +66,46 @@ class StatusBar(Gtk.Box):
         if player.props.state != Playback.PLAYING:
             return
 
-        track_path = player.track_path
+        self.__show_cover(player.track_path)
+
+    def __on_player_track_changed(self, player, track_path):
+        self.__show_cover(track_path)
+
+    def __show_cover(self, track_path):
         if self.__track_path == track_path:
             return
 
         self.__track_path = track_path
-        thread = threading.Thread(target=self.__update_cover)
-        thread.daemon = True
-        thread.start()
+        self.__app.art.request(track_path, self.__on_cover_ready, 32)
+
+    def add_import(self, importer):
+        self.__importers.append(importer)
+        importer.connect("progress", self.__on_import_progress)
+        importer.connect("finished", self.__on_import_finished)
+        self.__update_import_progress()
+        self.__import_box.show()
+
+    def __update_import_progress(self):
+        found = sum(i.found for i in self.__importers)
+        parsed = sum(i.parsed for i in self.__importers)
+        if found:
+            self.__import_progress.set_fraction(parsed / found)
+        else:
+            self.__import_progress.pulse()
+        self.__import_progress.set_text(_("Importing {} of {}").format(parsed, found))
+
+    def __on_import_progress(self, _importer, _parsed, _found):
+        self.__update_import_progress()
+
+    def __on_import_finished(self, importer, _cancelled):
+        if importer in self.__importers:
+            self.__importers.remove(importer)
+
+        if self.__importers:
+            self.__update_import_progress()
+        else:
+            self.__import_box.hide()
 
-            
+    def __on_import_cancel(self, _button):
+        for importer in self.__importers[:]:
+            importer.cancel()
@@ -87,9 +87,7 @@ class HeaderBar(Gtk.HeaderBar):
             if playlist is None:
                 playlist = self.__app.props.win.create_playlist_tab("playlist", selected=True)
 
-            for uri in dialog.get_filenames():
-                playlist.add_tracks(uri, None, True)
-            playlist.emit("changed")
+            playlist.add_tracks(dialog.get_filenames(), None, True)
 
         dialog.destroy()
 
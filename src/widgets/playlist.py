@@ -1,14 +1,14 @@
 from pathlib import Path
 from urllib.parse import unquote
-from itertools import compress
 
 from gettext import gettext as _
 from gi.repository import Gtk, Gdk, GObject
 from uuid import uuid4
 
 from beat.widgets.cell_renderers import *
-from beat.components.store import PlayListStore, PLAYLIST_COLS
-from beat.utils.track_info import TrackInfo
+from beat.components.store import PlayListStore, PLAYLIST_COLS, SORT_ORDERS
+from beat.components.virtual_store import VirtualPlayListStore
+from beat.components.importer import TrackImporter
 from beat.components.queue_manager import QueueState
 
 __all__ = ["PlayList"]
@@ -19,37 +19,50 @@ TARGETS = [
 
 ROW_ATOM = Gdk.Atom.intern_static_string("GTK_LIST_BOX_ROW")
 
+DETACH_THRESHOLD = 1000
+# an empty playlist getting at least this many rows at once switches to the
+# virtual model. A playlist growing past it through imports keeps its
+# ListStore, its rows may already be queued or playing.
+VIRTUAL_THRESHOLD = 50000
+# width of a column that was never drawn, when switching to the virtual model
+VIRTUAL_COLUMN_WIDTH = 100
+
 
 class PlayList(Gtk.TreeView):
     __gtype_name__ = "PlayList"
 
 
     __gsignals__ = {
-        "changed": (GObject.SignalFlags.RUN_FIRST, None, ())
+        "changed": (GObject.SignalFlags.RUN_FIRST, None, ()),
+        "import-started": (GObject.SignalFlags.RUN_FIRST, None, (TrackImporter,)),
     }
 
-    def __init__(self, app, label, uuid=None, saved=False):
+    def __init__(self, app, label, uuid=None, saved=False, loader=None):
         super().__init__()
         self.__app = app
         self.__label = label
         self.__uuid = uuid if uuid else str(uuid4())
         self.__selection = self.get_selection()
         self.__saved = saved
+        self.__loader = loader
+        self.__filter = None
+        self.__filter_text = None
+        self.__visible_ids = None
+        self.__column_layout = None
 
         # property
         # self.props.enable_search = True
         self.__selection.set_mode(Gtk.SelectionMode.MULTIPLE)
 
         # store
-        self.__store = PlayListStore(self.__uuid)
-        self.__store.connect("rows-reordered", self.__save_playlist)
+        self.__store = None
+        self.__set_store(PlayListStore(self.__uuid))
 
         # queue
         self.__queue = self.__app.props.queue
         self.__queue.connect("notify::state", self.__on_queue_state)
 
         self.props.activate_on_single_click = False
-        self.set_model(self.__store)
 
         # right click menu
         self.__menu = Gtk.Menu()
@@ -79,7 +92,9 @@ class PlayList(Gtk.TreeView):
                 continue
 
             renderer = col.get("cell_type")()
-            if issubclass(col.get("cell_type"), Gtk.CellRendererText):
+            if col.get("cell_type") == CellRendererDuration:
+                column = Gtk.TreeViewColumn(col["label"], renderer, duration=col_index)
+            elif issubclass(col.get("cell_type"), Gtk.CellRendererText):
                 column = Gtk.TreeViewColumn(col["label"], renderer, text=col_index)
             elif col.get("cell_type") == CellRendererActiveTrack:
                 column = Gtk.TreeViewColumn(col["label"], renderer)
@@ -88,12 +103,48 @@ class PlayList(Gtk.TreeView):
             else:
                 column = Gtk.TreeViewColumn(col["label"], renderer)
 
+            if col["key"] in SORT_ORDERS:
+                column.set_clickable(True)
+                column.connect("clicked", self.__on_column_clicked, col["key"])
             self.append_column(column)
 
         self.connect("drag_data_get", self.__on_data_get)
         self.connect("drag_data_received", self.__on_data_drop)
         self.connect("button_press_event", self.__on_button_press)
 
+    def __set_store(self, store):
+        self.__store = store
+        self.__store.connect("rows-reordered", self.__save_playlist)
+        self.__store.connect("search-ready", self.__on_search_ready)
+        self.__filter = None
+        self.__visible_ids = None
+        self.set_model(self.__store)
+
+    def __use_virtual_store(self):
+        # only an empty store is replaced, nothing can reference its rows yet
+        self.__set_store(VirtualPlayListStore(self.__uuid, first_id=self.__store.next_id))
+
+        # rows must not be measured one by one, columns keep the width they
+        # are drawn with and get it back with the list store
+        self.__column_layout = []
+        for column in self.get_columns():
+            self.__column_layout.append((column, column.get_sizing(), column.get_fixed_width()))
+            width = column.get_width() or column.get_fixed_width()
+            if width <= 0:
+                width = max(column.get_min_width(), VIRTUAL_COLUMN_WIDTH)
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            column.set_fixed_width(width)
+        self.set_fixed_height_mode(True)
+
+    def __use_list_store(self):
+        # an emptied virtual store goes back to the regular one
+        self.set_fixed_height_mode(False)
+        for column, sizing, width in self.__column_layout:
+            column.set_fixed_width(width)
+            column.set_sizing(sizing)
+        self.__column_layout = None
+        self.__set_store(PlayListStore(self.__uuid, first_id=self.__store.next_id))
+
     def __on_queue_state(self, queue, _state):
         active_ref = queue.active_ref
         if not active_ref:
@@ -103,9 +154,8 @@ class PlayList(Gtk.TreeView):
         if self.__store.active_ref != active_ref:
             self.__store.set_active_ref(None)
 
-        model = active_ref.get_model()
         state = queue.state
-        if self.__store == model:
+        if self.__store is active_ref.store:
             self.__store.set_active_ref(active_ref)
             if state == QueueState.PLAYING:
                 self.__store.set_state_for_active_ref("play")
@@ -114,23 +164,40 @@ class PlayList(Gtk.TreeView):
             else:
                 self.__store.set_state_for_active_ref("stop")
 
+    def __on_column_clicked(self, column, key):
+        if column.get_sort_indicator() and column.get_sort_order() == Gtk.SortType.ASCENDING:
+            order = Gtk.SortType.DESCENDING
+        else:
+            order = Gtk.SortType.ASCENDING
+
+        for other in self.get_columns():
+            other.set_sort_indicator(other is column)
+        column.set_sort_order(order)
+        self.__store.sort_by(key, descending=order == Gtk.SortType.DESCENDING)
+
     def __update_cell_active_track(self, _col, cell, model, tree_iter, _data):
-        ref = Gtk.TreeRowReference.new(self.__store, self.__store.get_path(tree_iter))
+        if model is not self.__store:
+            tree_iter = model.convert_iter_to_child_iter(tree_iter)
         cell.set_state(self.__store.get_state_for_iter(tree_iter))
 
-    def __get_selected_refs(self):
-        model, paths = self.__selection.get_selected_rows()
-        selected_refs = set()
-        for p in paths:
-            ref = Gtk.TreeRowReference.new(model, p)
-            selected_refs.add(ref)
+    def __to_store_path(self, path):
+        if self.__filter is not None and self.get_model() is self.__filter:
+            return self.__filter.convert_path_to_child_path(path)
+        return path
 
-        return selected_refs
+    def __get_selected_refs(self):
+        _model, paths = self.__selection.get_selected_rows()
+        store = self.__store
+        return [store.get_ref_for_iter(store.get_iter(self.__to_store_path(p))) for p in paths]
 
     def __on_row_delete(self, _view):
-        selected_refs = self.__get_selected_refs()
-        self.__store.remove_refs(selected_refs)
-        self.__queue.remove(selected_refs)
+        self.remove_refs(self.__get_selected_refs())
+
+    def remove_refs(self, refs):
+        self.__store.remove_refs(refs)
+        if self.__column_layout is not None and not len(self.__store):
+            self.__use_list_store()
+        self.__queue.remove(refs)
         self.emit("changed")
 
     def __on_add_to_queue(self, _view):
@@ -171,7 +238,7 @@ class PlayList(Gtk.TreeView):
         self.emit("changed")
 
     def __on_row_activated(self, _view, path, _column):
-        ref = Gtk.TreeRowReference(self.__store, path)
+        ref = self.__store.get_ref_for_iter(self.__store.get_iter(self.__to_store_path(path)))
         self.__store.set_active_ref(ref)
         self.__queue.play_ref(ref)
 
@@ -181,13 +248,12 @@ class PlayList(Gtk.TreeView):
             self.__queue.play_ref(ref)
 
     def __on_data_get(self, view, context, selection_data, info, timestamp):
-        model, paths = self.__selection().get_selected_rows()
-        iters = [model.get_iter(path) for path in paths]
-        iter_str = ','.join([model.get_string_from_iter(it) for it in iters])
+        _model, paths = self.__selection.get_selected_rows()
+        iter_str = ','.join([self.__to_store_path(path).to_string() for path in paths])
         selection_data.set(ROW_ATOM, 0, iter_str.encode())
 
     def __on_data_drop(self, view, context, x, y, selection_data, info, timestamp):
-        store = view.get_model()
+        store = self.__store
         data = selection_data.get_data()
 
         drop_info = view.get_dest_row_at_pos(x, y)
@@ -198,7 +264,7 @@ class PlayList(Gtk.TreeView):
 
         if drop_info:
             path, position = drop_info
-            position_iter = store.get_iter(path)
+            position_iter = store.get_iter(self.__to_store_path(path))
 
             if position in (Gtk.TreeViewDropPosition.BEFORE,
                             Gtk.TreeViewDropPosition.INTO_OR_BEFORE,
@@ -224,50 +290,116 @@ class PlayList(Gtk.TreeView):
                     store.move_before(i, None)
         else:
             paths = data.decode().split("\n")
-            for p in paths:
-                if not p:
-                    continue
-                filepath = unquote(p.strip().replace("file://", "", 1))
-                self.add_tracks(filepath, position_iter, insert_after)
-            self.emit("changed")
+            filepaths = [unquote(p.strip().replace("file://", "", 1)) for p in paths if p.strip()]
+            self.add_tracks(filepaths, position_iter, insert_after)
 
     def add_row(self, row, position_iter=None, insert_after=True):
         ref = self.__store.add_row(row, position_iter=position_iter, insert_after=insert_after)
         return ref
 
-    def add_tracks(self, path: str, position_iter=None, insert_after=True) -> list:
-        path = Path(path)
-        out = []
-        if not path.exists():
-            return out
+    def add_rows(self, rows, cols=None, position_iter=None, insert_after=True, refs=False):
+        if not len(self.__store) and hasattr(rows, "__len__") and len(rows) >= VIRTUAL_THRESHOLD \
+                and not isinstance(self.__store, VirtualPlayListStore):
+            self.__use_virtual_store()
 
-        if path.is_dir():
-            for p in path.iterdir():
-                out.extend(self.add_tracks(str(p), position_iter=position_iter, insert_after=insert_after))
-            return out
+        detach = not self.get_mapped() or not hasattr(rows, "__len__") \
+            or len(rows) >= DETACH_THRESHOLD
 
+        if not detach:
+            return self.__store.add_rows(rows, cols, position_iter, insert_after, refs)
+
+        model = self.get_model() or self.__store
+        self.set_model(None)
         try:
-            info = TrackInfo(path)
-        except:
-            return out
+            return self.__store.add_rows(rows, cols, position_iter, insert_after, refs)
+        finally:
+            self.set_model(model)
+
+    def __is_row_visible(self, model, tree_iter, _data):
+        return model.get_id_for_iter(tree_iter) in self.__visible_ids
+
+    def __on_search_ready(self, _store):
+        if self.__filter_text:
+            self.set_filter(self.__filter_text)
+
+    def prepare_search(self):
+        self.load()
+        self.__store.prepare_search()
+
+    def set_filter(self, text):
+        if text:
+            self.load()
+        self.__filter_text = text
+        visible_ids = self.__store.search(text) if text else None
+        if visible_ids is None:
+            if self.__filter is not None:
+                self.__filter = None
+                self.__visible_ids = None
+                self.set_model(self.__store)
+            return
 
-        row = {"src":   str(path),
-               "artist": info.artist,
-               "album":  info.album,
-               "title":  info.title,
-               "length": info.duration_str}
+        self.__visible_ids = visible_ids
+        self.set_model(None)
+        if self.__filter is None:
+            self.__filter = self.__store.filter_new(None)
+            self.__filter.set_visible_func(self.__is_row_visible)
+        self.__filter.refilter()
+        self.set_model(self.__filter)
+
+    def add_tracks(self, paths, position_iter=None, insert_after=True, play=False) -> TrackImporter:
+        if isinstance(paths, str):
+            paths = [paths]
+
+        anchor_ref = None
+        if position_iter:
+            anchor_ref = self.__store.get_ref_for_iter(position_iter)
+
+        state = {"anchor": anchor_ref, "play": play}
+
+        importer = TrackImporter((p for p in paths if Path(p).exists()), library=self.__app.props.library)
+        importer.connect("rows-ready", self.__on_import_rows, state, insert_after)
+        importer.connect("finished", self.__on_import_finished)
+        self.emit("import-started", importer)
+        importer.start()
+        return importer
+
+    def __on_import_rows(self, _importer, rows, state, insert_after):
+        anchor_ref = state["anchor"]
+        position_iter = None
+        if anchor_ref and anchor_ref.valid():
+            position_iter = self.__store.get_iter_for_id(anchor_ref.row_id)
+
+        # following batches go after the last inserted row
+        move_anchor = position_iter is not None and insert_after
+        refs = self.add_rows(rows, position_iter=position_iter, insert_after=insert_after,
+                             refs=state["play"] or move_anchor)
 
-        ref = self.add_row(row, position_iter, insert_after)
-        out.append(ref)
+        if move_anchor and refs:
+            state["anchor"] = refs[-1]
 
-        return out
+        if state["play"] and refs:
+            state["play"] = False
+            self.play(refs[0])
+
+    def __on_import_finished(self, _importer, _cancelled):
+        self.emit("changed")
 
     def get_cols(self):
         return [k["key"] for k in PLAYLIST_COLS if not k["key"].startswith("_")]
 
+    def is_loaded(self):
+        return self.__loader is None
+
+    def load(self):
+        if self.__loader is None:
+            return
+        loader, self.__loader = self.__loader, None
+        loader(self)
+
     def get_rows(self):
-        mask = [not k["key"].startswith("_") for k in PLAYLIST_COLS]
-        return [compress(t, mask) for t in self.__store]
+        # a cheap snapshot, the rows are built when it is iterated
+        self.load()
+        return self.__store.snapshot_rows(self.get_cols())
 
     @property
     def label(self):
@@ -288,6 +420,10 @@ class PlayList(Gtk.TreeView):
     def uuid(self):
         return self.__uuid
 
+    @property
+    def store(self):
+        return self.__store
+
     @property
     def active_ref(self):
         return self.__store.active_ref
@@ -1,14 +1,15 @@
-from gi.repository import Gtk, GLib
+from gi.repository import Gtk
 
 from beat.utils.track_info import TrackInfo
-from beat.components.player import Playback
+from beat.components.player import Playback, SeekMode
+from beat.widgets.visibility import VisibilityMixin
 
 
 __all__ = ["ProgressBar"]
 
 
 @Gtk.Template(resource_path="/ru/slie/beat/ui/progress.ui")
-class ProgressBar(Gtk.Box):
+class ProgressBar(VisibilityMixin, Gtk.Box):
     __gtype_name__ = "ProgressBar"
 
     __current_position_label = Gtk.Template.Child("_current_position")
@@ -21,31 +22,47 @@ class ProgressBar(Gtk.Box):
         self.__current_position_label.set_text("00:00")
         self.__duration_label.set_text("00:00")
         self.__player = self.__app.queue.props.player
-        self.__player.connect("clock-tick", self.__on_player_clock_tick)
         self.__player.connect("notify::state", self.__on_player_state)
+        self.__player.connect("notify::duration", self.__on_player_duration)
+        self.__position = self.__app.position
+        self.__position.connect("tick", self.__on_position_tick)
+        self._watch_visibility()
         self.__progress_handler_id = self.__progress_bar.connect("change-value", self.__on_seek)
-        # TODO: block handler
-        # self.__progress_bar.connect("button-press-event", self.__on_start_seeking)
+        self.__progress_bar.connect("button-press-event", self.__on_start_seeking)
         self.__progress_bar.connect("button-release-event", self.__on_finish_seeking)
         self.__progress_seeking_position = None
+        self.__dragging = False
+
+    def __on_start_seeking(self, _btn, _event):
+        self.__dragging = True
 
     def __on_finish_seeking(self, _btn, _event):
+        self.__dragging = False
         if self.__progress_seeking_position != None:
-            self.__player.set_position_by_percent(self.__progress_seeking_position)
+            self.__player.set_position_by_percent(self.__progress_seeking_position, SeekMode.ACCURATE)
+            self.__progress_seeking_position = None
 
     def __on_seek(self, progress, scroll, value):
-        self.__progress_seeking_position = value
+        value = max(0, min(value, 100))
+        if self.__dragging:
+            # scrub on keyframes, the accurate seek runs on release
+            self.__progress_seeking_position = value
+            self.__player.set_position_by_percent(value, SeekMode.FAST)
+        else:
+            self.__player.set_position_by_percent(value, SeekMode.ACCURATE)
 
-    def __on_player_state(self, player, *args):
-        def delayed_query():
-            duration = player.props.duration
-            if duration is not None and duration > 0:
-                self.__duration_label.set_text(TrackInfo.get_time_str(duration))
-            else:
-                self.__duration_label.set_text(TrackInfo.get_time_str(0))
+    def _on_visibility_changed(self):
+        self.__position.set_visible(self.is_seen())
 
-        GLib.timeout_add(1, delayed_query)
+    def __on_player_duration(self, player, *args):
+        duration = player.props.duration
+        if duration is not None and duration > 0:
+            self.__duration_label.set_text(TrackInfo.get_time_str(duration))
+        else:
+            self.__duration_label.set_text(TrackInfo.get_time_str(0))
 
+    def __on_player_state(self, player, *args):
+        self.__on_player_duration(player)
         if player.props.state in (Playback.STOPPED, Playback.READY):
             self.__set_progress(0)
 
@@ -54,9 +71,12 @@ class ProgressBar(Gtk.Box):
             self.__progress_bar.set_value(percent)
             self.__progress_bar.handler_unblock(self.__progress_handler_id)
 
-    def __on_player_clock_tick(self, player, val):
-        duration = player.props.duration
-        current = player.props.position
+    def __on_position_tick(self, position):
+        if not self.get_mapped() or self.__dragging:
+            return
+
+        duration = position.duration
+        current = position.position
         if not duration:
             self.__current_position_label.set_text(TrackInfo.get_time_str(0))
             return
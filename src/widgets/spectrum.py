@@ -1,9 +1,20 @@
-from collections import namedtuple
+from array import array
+from bisect import bisect_left, bisect_right
+from math import ceil
 
 import cairo
 from gi.repository import Gst, Gtk, Gdk, GObject, GLib
 
 from beat.components.player import Playback
+from beat.widgets.visibility import VisibilityMixin
+
+
+MIN_COL_WIDTH = 6
+MIN_BANDS = 16
+MAX_BANDS = 96
+FAST_INTERVAL = 50 * Gst.MSECOND
+SLOW_INTERVAL = 100 * Gst.MSECOND
+DECAY_PER_SECOND = 3.0
 
 
 def _interpolate_colors(start_color, target_color, steps):
@@ -28,7 +39,7 @@ def _interpolate_colors(start_color, target_color, steps):
     return out
 
 
-class SpectrumCol:
+class SpectrumLayout:
     #BRICK_BORDER_SIZE = 1
     #BRICK_BORDER_COLOR = (1.0, 1.0, 1.0, 1.0)
 
@@ -44,46 +55,70 @@ class SpectrumCol:
                                   COLOR_UPPER,
                                   COUNT)
 
-    def __init__(self, magnitute, spect_min, spect_max):
-        self.__min = spect_min
-        self.__max = spect_max
-        self.__cur = magnitute
-
-    def update(self, magnitute, spect_min, spect_max):
-        self.__min = spect_min
-        self.__max = spect_max
-        self.__cur = magnitute
-
-    def draw(self, col_width, col_height, cr, x_pos):
-        brick_h = (col_height - (self.GAP * (self.COUNT - 1))) / self.COUNT
-        if self.__max == self.__min:
-            return
-
-        upper = (self.__cur - self.__min)/(self.__max - self.__min) * self.COUNT
-
-        for i in range(self.COUNT):
-            if i >= upper:
+    PATTERNS = [cairo.SolidPattern(*c) for c in COLOURS]
+
+    def __init__(self, width, height, cols_count, cols_gap):
+        self.width = width
+        self.height = height
+        self.cols_count = cols_count
+        self.col_width = (width - (cols_gap * (cols_count - 1))) / cols_count
+        self.cols_x = [i * (self.col_width + cols_gap) for i in range(cols_count)]
+
+        self.brick_h = (height - (self.GAP * (self.COUNT - 1))) / self.COUNT
+        self.bricks_y = [height - i * (self.brick_h + self.GAP) - self.brick_h for i in range(self.COUNT)]
+
+    def matches(self, width, height, cols_count):
+        return self.width == width and self.height == height and self.cols_count == cols_count
+
+    def get_cols_range(self, x1, x2):
+        first = bisect_right(self.cols_x, x1) - 1
+        last = bisect_left(self.cols_x, x2)
+        return max(first, 0), min(last, self.cols_count)
+
+    def get_cols_area(self, first, last):
+        x = int(self.cols_x[first])
+        return x, int(self.cols_x[last] + self.col_width + 1) - x
+
+    def draw(self, cr, levels, first, last):
+        rectangle = cr.rectangle
+        col_width = self.col_width
+        brick_h = self.brick_h
+        cols_x = self.cols_x
+        for i, pattern in enumerate(self.PATTERNS):
+            y_pos = self.bricks_y[i]
+            has_path = False
+            for col in range(first, last):
+                if levels[col] > i:
+                    rectangle(cols_x[col], y_pos, col_width, brick_h)
+                    has_path = True
+            if not has_path:
                 break
-            y_pos = col_height - i*(brick_h + self.GAP) - brick_h
-            cr.rectangle(x_pos, y_pos, col_width, brick_h)
-            cr.set_source_rgba(*self.COLOURS[i])
+            cr.set_source(pattern)
             cr.fill()
 
 
-class Spectrum(Gtk.DrawingArea):
+class Spectrum(VisibilityMixin, Gtk.DrawingArea):
     def __init__(self, app):
         super().__init__()
         self.__app = app
         self.__player = self.__app.props.queue.props.player
-        self.__surface = None
         self.__cols_gap = 2
         self.__height_scale = 1.0
-        self.__spect_cols = []
+        self.__levels = array('B')
+        self.__display = array('f')
+        self.__targets = array('f')
+        self.__layout = None
+        self.__front_buffer = array('f')
+        self.__back_buffer = array('f')
+        self.__tick_id = None
+        self.__last_frame_time = None
         bus = self.__player.playbin.get_bus()
         bus.connect('message', self.__on_message_handler)
         self.__player.connect('notify::state', self.__on_player_state)
         self.__player.connect('eos', self.__on_player_eos)
         self.connect("draw", self.__draw_spectrum)
+        self._watch_visibility()
+        self.connect("size-allocate", self.__on_size_allocate)
         # TODO: make change spectrum vis
         #self.connect("button_press_event", self.__on_key_press)
         #self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
@@ -94,14 +129,28 @@ class Spectrum(Gtk.DrawingArea):
     #def __on_key_press(self, _widget, _event):
     #    print("clicked")
 
+    def _on_visibility_changed(self):
+        self.__player.set_spectrum_enabled(self.is_seen())
+        if not self.get_mapped():
+            self.__stop_ticking()
+
+    def __on_size_allocate(self, _widget, allocation):
+        bands = allocation.width // (MIN_COL_WIDTH + self.__cols_gap)
+        bands = max(MIN_BANDS, min(bands, MAX_BANDS))
+        interval = FAST_INTERVAL if bands >= MAX_BANDS // 2 else SLOW_INTERVAL
+        self.__player.configure_spectrum(bands, interval)
+
+    def __clear(self):
+        for i in range(len(self.__targets)):
+            self.__targets[i] = 0.0
+        self.__start_ticking()
+
     def __on_player_eos(self, player):
-        self.__spect_cols = []
-        self.queue_draw()
+        self.__clear()
 
     def __on_player_state(self, player, state):
         if player.props.state != Playback.PLAYING:
-            self.__spect_cols = []
-            self.queue_draw()
+            self.__clear()
 
     def __on_message_handler(self, bus, message):
         if message.type == Gst.MessageType.ELEMENT:
@@ -115,56 +164,123 @@ class Spectrum(Gtk.DrawingArea):
             if s.has_field("stream-time") and s.has_field("duration"):
                 waittime = s.get_value("stream-time") + s.get_value("duration")
 
-            if waittime:
-                fullstr = s.to_string()
-                magstr = fullstr[fullstr.find('{') + 1: fullstr.rfind('}') - 1]
-                magnitude_list = [float(x) for x in magstr.split(',')]
-                spect = [i * self.__height_scale for i in magnitude_list]
-                GLib.idle_add(self.__delayed_idle_spectrum_update, spect)
+            if waittime and self.__read_magnitudes(s):
+                self.__update_spectrum()
+
+        return True
+
+    def __read_magnitudes(self, structure):
+        success, values = structure.get_list("magnitude")
+        if not success:
+            return False
+
+        count = values.n_values
+        if not count:
+            return False
+
+        buffer = self.__back_buffer
+        if len(buffer) != count:
+            buffer = self.__back_buffer = array('f', bytes(buffer.itemsize * count))
 
+        get_nth = values.get_nth
+        for i in range(count):
+            buffer[i] = get_nth(i)
+
+        self.__front_buffer, self.__back_buffer = buffer, self.__front_buffer
         return True
 
-    def __delayed_idle_spectrum_update(self, spect):
+    def __update_spectrum(self):
+        spect = self.__front_buffer
         spect_max = max(spect)
         spect_min = min(spect)
+        count = len(spect)
 
-        if len(self.__spect_cols) != len(spect):
-            self.__spect_cols = []
-            for s in spect:
-                col = SpectrumCol(s, spect_min, spect_max)
-                self.__spect_cols.append(col)
-        else:
+        if len(self.__targets) != count:
+            self.__targets = array('f', bytes(4 * count))
+            self.__display = array('f', bytes(4 * count))
+            self.__levels = array('B', bytes(count))
+            self.queue_draw()
+
+        targets = self.__targets
+        if spect_max != spect_min:
+            scale = SpectrumLayout.COUNT / (spect_max - spect_min) * self.__height_scale
             for i, s in enumerate(spect):
-                col = self.__spect_cols[i]
-                col.update(s, spect_min, spect_max)
+                targets[i] = (s - spect_min) * scale
+        else:
+            for i in range(count):
+                targets[i] = 0.0
 
-        self.queue_draw()
-        return False
+        self.__start_ticking()
 
-    def __draw_spectrum(self, area, cr):
-        if not self.__spect_cols:
-            cr.push_group()
-            cr.pop_group_to_source()
-            cr.paint()
-            return True
+    def __start_ticking(self):
+        if self.__tick_id is None and self.get_mapped():
+            self.__last_frame_time = None
+            self.__tick_id = self.add_tick_callback(self.__on_tick)
+
+    def __stop_ticking(self):
+        if self.__tick_id is not None:
+            self.remove_tick_callback(self.__tick_id)
+            self.__tick_id = None
 
+    def __on_tick(self, _widget, frame_clock):
+        frame_time = frame_clock.get_frame_time()
+        if self.__last_frame_time is None:
+            elapsed = 0.0
+        else:
+            elapsed = (frame_time - self.__last_frame_time) / 1000000
+        self.__last_frame_time = frame_time
+
+        count = SpectrumLayout.COUNT
+        decay = count * DECAY_PER_SECOND * elapsed
+        targets = self.__targets
+        display = self.__display
+        levels = self.__levels
+        first = last = None
+        animating = False
+
+        for i in range(len(targets)):
+            target = targets[i]
+            value = display[i]
+            if target >= value:
+                value = target
+            else:
+                value = max(target, value - decay)
+                animating = True
+            display[i] = value
+
+            level = min(ceil(value), count)
+            if level != levels[i]:
+                levels[i] = level
+                if first is None:
+                    first = i
+                last = i
+
+        if first is not None:
+            layout = self.__get_layout()
+            x, width = layout.get_cols_area(first, last)
+            self.queue_draw_area(x, 0, width, layout.height)
+
+        if animating:
+            return GLib.SOURCE_CONTINUE
+
+        self.__tick_id = None
+        return GLib.SOURCE_REMOVE
+
+    def __get_layout(self):
         w = self.get_allocated_width()
         h = self.get_allocated_height()
+        cols_count = len(self.__levels)
+        if not self.__layout or not self.__layout.matches(w, h, cols_count):
+            self.__layout = SpectrumLayout(w, h, cols_count, self.__cols_gap)
+        return self.__layout
 
-        cr.push_group()
-
-        cols_count = len(self.__spect_cols)
-
-        col_width = (w - (self.__cols_gap * (cols_count - 1))) / cols_count
-
-        x_pos = 0
-
-        for i, col in enumerate(self.__spect_cols):
-            if i != 0:
-                x_pos += self.__cols_gap + col_width
-            col.draw(col_width, h, cr, x_pos)
+    def __draw_spectrum(self, area, cr):
+        if not self.__levels:
+            return True
 
-        cr.pop_group_to_source()
-        cr.paint()
+        layout = self.__get_layout()
+        x1, _y1, x2, _y2 = cr.clip_extents()
+        first, last = layout.get_cols_range(x1, x2)
+        layout.draw(cr, self.__levels, first, last)
 
         return True
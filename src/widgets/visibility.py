@@ -0,0 +1,36 @@
+from gi.repository import Gtk, Gdk
+
+
+__all__ = ["VisibilityMixin"]
+
+
+class VisibilityMixin:
+    # For widgets that only need to work while they can be seen: mapped and
+    # not in an iconified window. Call _watch_visibility() once and override
+    # _on_visibility_changed().
+
+    def _watch_visibility(self):
+        self.__toplevel = None
+        self.__iconified = False
+        self.connect("map", self.__on_map)
+        self.connect("unmap", self.__on_unmap)
+
+    def __on_map(self, _widget):
+        toplevel = self.get_toplevel()
+        if toplevel is not self.__toplevel and isinstance(toplevel, Gtk.Window):
+            self.__toplevel = toplevel
+            toplevel.connect("window-state-event", self.__on_window_state)
+        self._on_visibility_changed()
+
+    def __on_unmap(self, _widget):
+        self._on_visibility_changed()
+
+    def __on_window_state(self, _window, event):
+        self.__iconified = bool(event.new_window_state & Gdk.WindowState.ICONIFIED)
+        self._on_visibility_changed()
+
+    def is_seen(self):
+        return self.get_mapped() and not self.__iconified
+
+    def _on_visibility_changed(self):
+        pass
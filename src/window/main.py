@@ -15,7 +15,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Gtk, GObject, Gdk
+from gi.repository import Gtk, GObject, Gdk, GLib
 from gettext import gettext as _
 
 from beat.window.tab import Tab
@@ -49,22 +49,70 @@ class BeatWindow(Gtk.ApplicationWindow):
         self.__app = app
         self.__header = HeaderBar(self.__app)
         progress = ProgressBar(self.__app)
-        footer = StatusBar(self.__app)
+        self.__footer = StatusBar(self.__app)
         self.set_titlebar(self.__header)
 
         self.__body.pack_start(progress, False, False, 0)
-        self.__body.pack_end(footer, False, False, 0)
+        self.__body.pack_end(self.__footer, False, False, 0)
         self.__body.reorder_child(progress, 0)
         self.__notebook.connect("switch-page", self.__on_switch_tab)
 
+        # search
+        self.__search_entry = Gtk.SearchEntry()
+        self.__search_entry.set_placeholder_text(_("Search artist, album or title"))
+        self.__search_entry.set_width_chars(40)
+        self.__search_entry.connect("search-changed", self.__on_search_changed)
+        self.__search_bar = Gtk.SearchBar()
+        self.__search_bar.add(self.__search_entry)
+        self.__search_bar.connect_entry(self.__search_entry)
+        self.__search_bar.connect("notify::search-mode-enabled", self.__on_search_mode)
+        self.__search_bar.show_all()
+        self.__body.pack_start(self.__search_bar, False, False, 0)
+        self.__body.reorder_child(self.__search_bar, 1)
+        self.connect("key-press-event", self.__on_key_press)
+
     @property
     def header(self):
         return self.__header
 
     def __on_switch_tab(self, _notebook, page, index):
         playlist = page.get_children()[0].get_children()[0]
+        # the previous tab is -1 while the first one is added, and it must
+        # not be loaded just to clear its filter
+        current_page = self.__notebook.get_current_page()
+        scrollbox = self.__notebook.get_nth_page(current_page) if current_page >= 0 else None
+        if scrollbox is not None and scrollbox is not page:
+            scrollbox.get_children()[0].get_children()[0].set_filter(None)
+        if self.__search_bar.get_search_mode() and self.__search_entry.get_text():
+            playlist.set_filter(self.__search_entry.get_text())
+        elif not playlist.is_loaded():
+            GLib.idle_add(self.__load_current_playlist)
         self.emit("tab-selected", playlist.uuid)
 
+    def __on_key_press(self, _window, event):
+        if event.state & Gdk.ModifierType.CONTROL_MASK and event.keyval in (Gdk.KEY_f, Gdk.KEY_F):
+            self.__search_bar.set_search_mode(not self.__search_bar.get_search_mode())
+            return True
+        return False
+
+    def __on_search_changed(self, entry):
+        playlist = self.get_current_playlist()
+        if playlist is not None:
+            playlist.set_filter(entry.get_text())
+
+    def __on_search_mode(self, search_bar, _param):
+        if not search_bar.get_search_mode():
+            self.__search_entry.set_text("")
+            return
+
+        playlist = self.get_current_playlist()
+        if playlist is not None:
+            playlist.prepare_search()
+
+    def __load_current_playlist(self):
+        self.get_current_playlist()
+        return False
+
     def __toggle_show_tabs(self):
         if self.__notebook.get_n_pages() > 1:
             self.__notebook.set_show_tabs(True)
@@ -74,14 +122,17 @@ class BeatWindow(Gtk.ApplicationWindow):
     def __on_playlist_chaned(self, playlist):
         self.emit("playlist-changed", playlist)
 
-    def create_playlist_tab(self, label, rows=None, uuid=None, selected=False, saved=False) -> PlayList:
-        playlist = PlayList(self.__app, label, uuid, saved=saved)
+    def __on_playlist_import_started(self, _playlist, importer):
+        self.__footer.add_import(importer)
+
+    def create_playlist_tab(self, label, rows=None, uuid=None, selected=False, saved=False, loader=None) -> PlayList:
+        playlist = PlayList(self.__app, label, uuid, saved=saved, loader=loader)
         playlist.connect("changed", self.__on_playlist_chaned)
+        playlist.connect("import-started", self.__on_playlist_import_started)
         scrollbox = Gtk.ScrolledWindow()
         scrollbox.add_with_viewport(playlist)
         if rows:
-            for row in rows:
-                playlist.add_row(row)
+            playlist.add_rows(rows)
 
         tab = Tab(label)
         tab.connect("deleted", self.__on_delete_tab, playlist)
@@ -109,10 +160,24 @@ class BeatWindow(Gtk.ApplicationWindow):
         self.__toggle_show_tabs()
         self.emit("tab-removed", playlist.uuid)
 
+    def get_playlists(self):
+        playlists = []
+        for page in range(self.__notebook.get_n_pages()):
+            scrollbox = self.__notebook.get_nth_page(page)
+            playlists.append(scrollbox.get_children()[0].get_children()[0])
+        return playlists
+
+    def select_playlist(self, playlist):
+        page = self.__notebook.page_num(playlist.get_parent().get_parent())
+        if page >= 0:
+            self.__notebook.set_current_page(page)
+
     def get_current_playlist(self):
        scrollbox = self.__notebook.get_nth_page(self.__notebook.get_current_page())
        if scrollbox is None:
            return None
 
-       return scrollbox.get_children()[0].get_children()[0]
+       playlist = scrollbox.get_children()[0].get_children()[0]
+       playlist.load()
+       return playlist
 
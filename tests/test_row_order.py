@@ -0,0 +1,118 @@
+import importlib.util
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location(
+    "row_order", Path(__file__).resolve().parent.parent / "src" / "components" / "row_order.py")
+row_order = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(row_order)
+RowOrder = row_order.RowOrder
+
+
+def check(rows):
+    # every cached position must match the actual order
+    for position, row_id in enumerate(rows):
+        assert rows.index(row_id) == position
+        assert rows.id_at(position) == row_id
+
+
+def make(count):
+    rows = RowOrder()
+    for i in range(count):
+        rows.insert(i)
+    return rows
+
+
+def test_append():
+    rows = make(5)
+    assert list(rows) == [1, 2, 3, 4, 5]
+    assert rows.next_id == 6
+    check(rows)
+
+
+def test_insert():
+    rows = make(5)
+    assert rows.insert(0) == 6
+    assert rows.insert(3) == 7
+    assert rows.insert(100) == 8
+    assert list(rows) == [6, 1, 2, 7, 3, 4, 5, 8]
+    check(rows)
+
+
+def test_insert_after_lookup():
+    rows = make(5)
+    assert rows.index(5) == 4
+    rows.insert(2)
+    assert rows.index(5) == 5
+    assert rows.index(6) == 2
+    check(rows)
+
+
+def test_remove():
+    rows = make(5)
+    assert rows.remove(2) == 1
+    assert rows.remove(2) == -1
+    assert 2 not in rows
+    assert rows.index(2) == -1
+    assert list(rows) == [1, 3, 4, 5]
+    check(rows)
+
+    # ids are never reused
+    assert rows.insert(1) == 6
+    assert list(rows) == [1, 6, 3, 4, 5]
+    check(rows)
+
+
+def test_reorder():
+    rows = make(4)
+    rows.reorder([3, 2, 1, 0])
+    assert list(rows) == [4, 3, 2, 1]
+    check(rows)
+
+
+def test_move():
+    rows = make(5)
+    assert rows.move(1, 3) == [1, 2, 0, 3, 4]
+    assert list(rows) == [2, 3, 1, 4, 5]
+    check(rows)
+
+    assert rows.move(5, 0) == [4, 0, 1, 2, 3]
+    assert list(rows) == [5, 2, 3, 1, 4]
+    check(rows)
+
+    assert rows.move(5, 0) is None
+    assert rows.move(5, 1) is None
+    assert rows.move(42, 0) is None
+
+
+def test_slice():
+    rows = make(10)
+    assert rows.slice(2, 3) == [3, 4, 5]
+    assert rows.slice(8) == [9, 10]
+    assert rows.slice(20, 5) == []
+
+
+def test_contains():
+    rows = make(2)
+    assert 1 in rows
+    assert 0 not in rows
+    assert 3 not in rows
+
+
+def test_first_id():
+    rows = RowOrder(first_id=10)
+    assert rows.insert(0) == 10
+    assert rows.insert(0) == 11
+    assert rows.insert(1) == 12
+    assert list(rows) == [11, 12, 10]
+    assert 9 not in rows
+    assert rows.remove(12) == 1
+    assert rows.next_id == 13
+    check(rows)
+
+
+def test_copy():
+    rows = make(3)
+    ids = rows.copy()
+    rows.remove(2)
+    rows.insert(0)
+    assert list(ids) == [1, 2, 3]
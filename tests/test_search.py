@@ -0,0 +1,72 @@
+import importlib.util
+from pathlib import Path
+from random import Random
+
+spec = importlib.util.spec_from_file_location(
+    "search", Path(__file__).resolve().parent.parent / "src" / "components" / "search.py")
+search = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(search)
+SearchIndex = search.SearchIndex
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ra", "to", "su", "vel", "dor", "an", "qu", "ix"]
+
+
+def word(rnd):
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(1, 3)))
+
+
+def make(count, seed=1):
+    # enough rows for the common grams to get bitmaps
+    rnd = Random(seed)
+    rows = {row_id: (word(rnd), word(rnd), f"{word(rnd)} {word(rnd)}") for row_id in range(1, count + 1)}
+    index = SearchIndex()
+    for row_id, values in rows.items():
+        index.add(row_id, values)
+    index.build_bitmaps()
+    return index, rows
+
+
+def expected(rows, text):
+    tokens = [t for t in text.casefold().split() if len(t) > 1]
+    return {row_id for row_id, values in rows.items() if all(t in "\n".join(values) for t in tokens)}
+
+
+def check(index, rows, queries):
+    for text in queries:
+        result = index.query(text)
+        assert set(result) == expected(rows, text), text
+        assert len(result) == len(expected(rows, text)), text
+
+
+QUERIES = ["ka", "ra", "vel", "kalo", "dorvel", "ka lo", "vel dor ka", "qu ix", "mine ra", "zz", "KA Lo"]
+
+
+def test_matches_substrings():
+    index, rows = make(5000)
+    check(index, rows, QUERIES)
+
+
+def test_short_words_do_not_filter():
+    index, _rows = make(10)
+    assert index.query("") is None
+    assert index.query("a b") is None
+
+
+def test_remove_and_add():
+    index, rows = make(5000)
+    rnd = Random(2)
+    for row_id in rnd.sample(sorted(rows), 2000):
+        index.remove(row_id)
+        del rows[row_id]
+    check(index, rows, QUERIES)
+
+    for row_id in range(5001, 6001):
+        rows[row_id] = ("dorvel", word(rnd), word(rnd))
+        index.add(row_id, rows[row_id])
+    check(index, rows, QUERIES)
+
+    # enough removals to compact the lists
+    for row_id in rnd.sample(sorted(rows), 3000):
+        index.remove(row_id)
+        del rows[row_id]
+    check(index, rows, QUERIES)
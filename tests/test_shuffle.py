@@ -0,0 +1,123 @@
+import importlib.util
+from random import Random
+from pathlib import Path
+
+spec = importlib.util.spec_from_file_location(
+    "shuffle", Path(__file__).resolve().parent.parent / "src" / "components" / "shuffle.py")
+shuffle = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(shuffle)
+ShuffleOrder = shuffle.ShuffleOrder
+
+
+def make(count, first_id=1, seed=42):
+    order = ShuffleOrder(first_id, seed=seed)
+    order.add(range(first_id, first_id + count))
+    return order
+
+
+def draw(order, count):
+    return [order.next() for _ in range(count)]
+
+
+def test_cycle_plays_every_row_once():
+    order = make(50)
+    played = draw(order, 50)
+    assert sorted(played) == list(range(1, 51))
+    assert order.remaining == 0
+
+    # the next cycle starts over
+    assert sorted(draw(order, 50)) == list(range(1, 51))
+
+
+def test_seed_is_deterministic():
+    assert draw(make(30, seed=7), 30) == draw(make(30, seed=7), 30)
+    assert draw(make(30, seed=7), 30) != draw(make(30, seed=8), 30)
+
+
+def test_peek_is_stable_until_consumed():
+    order = make(10)
+    row_id = order.peek()
+    assert order.peek() == row_id
+    order.consume(row_id)
+    assert order.remaining == 9
+    assert order.peek() != row_id
+
+
+def test_consume_picked_row():
+    order = make(10)
+    order.consume(4)
+    assert order.remaining == 9
+    assert 4 not in draw(order, 9)
+
+
+def test_remove_keeps_played_rows():
+    order = make(20)
+    played = draw(order, 8)
+    removed = [r for r in range(1, 21) if r not in played][:5] + played[:2]
+    order.remove(removed)
+    assert len(order) == 13
+    rest = draw(order, order.remaining)
+    assert not set(rest) & set(played)
+    assert not set(rest) & set(removed)
+    assert sorted(rest + played[2:]) == sorted(set(range(1, 21)) - set(removed))
+
+
+def test_add_joins_current_cycle():
+    order = make(10)
+    played = draw(order, 6)
+    order.add([11, 12, 13])
+    assert order.remaining == 7
+    rest = draw(order, 7)
+    assert sorted(played + rest) == list(range(1, 14))
+
+
+def test_remove_then_add():
+    order = make(5, first_id=10)
+    order.remove([12, 10])
+    order.add([15, 16])
+    assert sorted(draw(order, 5)) == [11, 13, 14, 15, 16]
+    assert order.remaining == 0
+
+
+def test_remove_pending():
+    order = make(5)
+    row_id = order.peek()
+    order.remove([row_id])
+    assert order.peek() != row_id
+    assert row_id not in draw(order, 4)
+
+
+def test_exclude():
+    order = make(2)
+    for _ in range(10):
+        assert order.next(exclude=1) == 2
+        order.consume(1)
+
+
+def test_random_edits():
+    rng = Random(1)
+    order = make(0)
+    rows = set()
+    next_id = 1
+    unplayed = set()
+    for _ in range(2000):
+        op = rng.random()
+        if op < 0.3:
+            added = list(range(next_id, next_id + rng.randrange(1, 4)))
+            next_id += len(added)
+            order.add(added)
+            rows.update(added)
+            unplayed.update(added)
+        elif op < 0.45 and rows:
+            removed = rng.sample(sorted(rows), min(len(rows), rng.randrange(1, 3)))
+            order.remove(removed)
+            rows.difference_update(removed)
+            unplayed.difference_update(removed)
+        elif rows:
+            if not unplayed:
+                unplayed = set(rows)
+            row_id = order.next()
+            assert row_id in unplayed
+            unplayed.remove(row_id)
+        assert len(order) == len(rows)
+        assert order.remaining == len(unplayed) or not unplayed
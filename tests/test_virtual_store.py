@@ -0,0 +1,120 @@
+import importlib
+import importlib.util
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+gi = pytest.importorskip("gi")
+gi.require_version("Gtk", "3.0")
+from gi.repository import Gio, Gtk  # noqa: E402
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def store_cls():
+    if "beat" not in sys.modules:
+        data_dir = ROOT / "data"
+        with tempfile.TemporaryDirectory() as tmp:
+            target = Path(tmp, "beat.gresource")
+            subprocess.run(["glib-compile-resources", "--sourcedir", str(data_dir),
+                            "--target", str(target), str(data_dir / "beat.gresource.xml")], check=True)
+            Gio.resources_register(Gio.Resource.load(str(target)))
+
+        spec = importlib.util.spec_from_file_location("beat", ROOT / "src" / "__init__.py",
+                                                      submodule_search_locations=[str(ROOT / "src")])
+        sys.modules["beat"] = importlib.util.module_from_spec(spec)
+    return importlib.import_module("beat.components.virtual_store").VirtualPlayListStore
+
+
+def make_rows(count, start=0):
+    return [{"src": f"/music/{i}.flac", "artist": f"artist {i}", "title": f"title {i}"}
+            for i in range(start, start + count)]
+
+
+def titles(store):
+    return [row[0] for row in store.iter_rows(("title",))]
+
+
+def test_iters_stay_valid(store_cls):
+    store = store_cls("test")
+    refs = store.add_rows(make_rows(5), refs=True)
+    tree_iter = store.get_iter_for_id(refs[2].row_id)
+
+    store.add_rows(make_rows(2, start=5), position_iter=store.get_iter_for_id(refs[0].row_id))
+    assert store.get_path(tree_iter).get_indices() == [4]
+    assert store.get_ref_for_iter(tree_iter) == refs[2]
+
+    store.remove_refs([refs[0], refs[1]])
+    assert store.get_path(tree_iter).get_indices() == [2]
+
+    store.sort_by("title", descending=True)
+    assert store.get_path(tree_iter).get_indices() == [titles(store).index("title 2")]
+    assert not refs[0].valid()
+    assert refs[2].valid()
+
+
+def test_positions(store_cls):
+    store = store_cls("test")
+    refs = store.add_rows(make_rows(4), refs=True)
+    store.move_before(store.get_iter_for_id(refs[3].row_id), store.get_iter_for_id(refs[0].row_id))
+    assert titles(store) == ["title 3", "title 0", "title 1", "title 2"]
+    assert [store.get_index_for_ref(r) for r in refs] == [1, 2, 3, 0]
+
+    store.move_after(store.get_iter_for_id(refs[3].row_id), store.get_iter_for_id(refs[2].row_id))
+    assert [store.get_index_for_ref(r) for r in refs] == [0, 1, 2, 3]
+
+
+def test_append_without_handler_skips_row_inserted(store_cls, monkeypatch):
+    store = store_cls("test")
+    emitted = []
+    monkeypatch.setattr(store, "row_inserted", lambda path, tree_iter: emitted.append(path))
+    refs = store.add_rows(make_rows(3), refs=True)
+    assert emitted == []
+    assert [r.row_id for r in refs] == [1, 2, 3]
+    assert titles(store) == ["title 0", "title 1", "title 2"]
+    assert store.get_title_for_ref(refs[2]) == "title 2"
+    assert store.get_index_for_ref(refs[2]) == 2
+
+
+def test_append_with_handler_emits_row_inserted(store_cls):
+    store = store_cls("test")
+    inserted = []
+    store.add_rows(make_rows(3))
+    store.connect("row-inserted", lambda model, path, tree_iter: inserted.append(path.get_indices()[0]))
+    store.add_rows(make_rows(2, start=3))
+    assert inserted == [3, 4]
+
+    # inserting in the middle always notifies
+    store.add_rows(make_rows(1, start=5), position_iter=store.get_iter_for_id(1))
+    assert inserted == [3, 4, 1]
+
+
+def test_view_sees_appended_rows(store_cls):
+    store = store_cls("test")
+    view = Gtk.TreeView(model=store.filter_new())
+    store.add_rows(make_rows(3))
+    assert len(view.get_model()) == 3
+
+
+def test_first_id(store_cls):
+    store = store_cls("test", first_id=10)
+    refs = store.add_rows(make_rows(2), refs=True)
+    assert [r.row_id for r in refs] == [10, 11]
+    assert store.next_id == 12
+    assert not store.has_id(1)
+    assert titles(store) == ["title 0", "title 1"]
+
+
+def test_snapshot_rows(store_cls):
+    store = store_cls("test")
+    refs = store.add_rows(make_rows(3), refs=True)
+    rows = store.snapshot_rows(("title", "artist"))
+    store.remove_refs([refs[0]])
+    store.add_rows(make_rows(1, start=3))
+    store.sort_by("title", descending=True)
+    assert list(rows) == [["title 0", "artist 0"], ["title 1", "artist 1"], ["title 2", "artist 2"]]